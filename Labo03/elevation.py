@@ -0,0 +1,145 @@
+import os
+import gzip
+import numpy as np
+from geoterrain import readRaster
+
+'''
+Lecture des grilles d'altitudes pour map.py.
+
+Le format est détecté à l'ouverture :
+ - .bil / .hgt : raster brut projeté en mémoire (seules les parties utilisées
+   sont lues), lu par geoterrain.readRaster : type et dimensions du .hdr s'il
+   existe, sinon carré en int16, big-endian pour un .hgt (SRTM) ;
+ - .npy : tableau NumPy, projeté en mémoire lui aussi ;
+ - texte (première ligne ignorée, une ligne de la grille par ligne), éventuellement
+   compressé en gzip ou zstd (nécessite zstandard, pip install zstandard). Le texte
+   est découpé par blocs avec np.fromstring, sans garder le fichier en mémoire.
+
+Le texte peut être converti une fois pour toutes en .npy :
+    python elevation.py <grille.txt> [<sortie.npy>]
+'''
+
+# taille des blocs de texte lus à la fois (octets)
+DEFAULT_CHUNK_SIZE = 16 << 20
+
+RASTER_EXTENSIONS = (".bil", ".hgt")
+COMPRESSED_EXTENSIONS = (".gz", ".zst", ".zstd")
+
+# textes d'origine possibles d'un .npy, pour le reconstruire s'il est illisible
+SOURCE_EXTENSIONS = (".txt",) + tuple(".txt" + extension for extension in COMPRESSED_EXTENSIONS)
+
+NPY_MAGIC = b"\x93NUMPY"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+# découpe un flux de texte (bytes) en grille int32, la ligne d'en-tête est ignorée
+def parseText(stream, chunkSize=DEFAULT_CHUNK_SIZE):
+    chunks = []
+    columns = None
+    header = True
+    rest = b""
+    while True:
+        block = stream.read(chunkSize)
+        last = not block
+        block = rest + block
+        if header:
+            newline = block.find(b"\n")
+            if newline < 0 and not last:
+                rest = block
+                continue
+            block = block[newline + 1:] if newline >= 0 else b""
+            header = False
+
+        # seules les lignes complètes sont converties, la fin est gardée pour le bloc suivant
+        cut = len(block) if last else block.rfind(b"\n") + 1
+        rest = block[cut:]
+        if cut > 0:
+            if columns is None:
+                columns = len(block[:block.find(b"\n") if b"\n" in block else cut].split())
+            chunks.append(np.fromstring(block[:cut], dtype=np.int32, sep=" "))
+        if last:
+            break
+
+    if not columns:
+        raise ValueError("Empty elevation grid")
+    values = np.concatenate(chunks)
+    if values.size % columns:
+        raise ValueError("Irregular elevation grid : {} values for {} columns".format(values.size, columns))
+    return values.reshape(-1, columns)
+
+
+# grille d'altitudes (lignes, colonnes) quel que soit le format du fichier
+def loadElevation(path, chunkSize=DEFAULT_CHUNK_SIZE):
+    if path.lower().endswith(RASTER_EXTENSIONS):
+        return readRaster(path)
+
+    with open(path, "rb") as f:
+        magic = f.read(len(NPY_MAGIC))
+
+    if magic.startswith(NPY_MAGIC):
+        # un .npy tronqué est reconverti depuis son texte d'origine s'il est à côté
+        try:
+            return np.load(path, mmap_mode="r")
+        except (ValueError, OSError, EOFError):
+            base = os.path.splitext(path)[0]
+            for source in (base + extension for extension in SOURCE_EXTENSIONS):
+                if os.path.isfile(source):
+                    return np.load(convertToNpy(source, path), mmap_mode="r")
+            raise
+    if magic.startswith(GZIP_MAGIC):
+        with gzip.open(path, "rb") as stream:
+            return parseText(stream, chunkSize)
+    if magic.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Reading zstd files requires zstandard (pip install zstandard)")
+        with open(path, "rb") as f:
+            with zstandard.ZstdDecompressor().stream_reader(f) as stream:
+                return parseText(stream, chunkSize)
+    with open(path, "rb") as stream:
+        return parseText(stream, chunkSize)
+
+
+# convertit une grille (texte ou autre) en .npy, relu ensuite sans analyse
+def convertToNpy(path, output=None):
+    if output is None:
+        base = path
+        if base.lower().endswith(COMPRESSED_EXTENSIONS):
+            base = os.path.splitext(base)[0]
+        output = os.path.splitext(base)[0] + ".npy"
+    altitudes = loadElevation(path)
+
+    # écriture dans un fichier temporaire propre au processus, relu pour vérification,
+    # puis renommage pour rester atomique
+    temporaryPath = output + ".{}.tmp.npy".format(os.getpid())
+    try:
+        np.save(temporaryPath, altitudes)
+        written = np.load(temporaryPath, mmap_mode="r")
+        if written.shape != altitudes.shape or written.dtype != altitudes.dtype:
+            raise ValueError("Unable to write elevation grid " + output)
+        del written
+        os.replace(temporaryPath, output)
+    finally:
+        if os.path.isfile(temporaryPath):
+            os.remove(temporaryPath)
+    return output
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print("Usage : python elevation.py <elevation grid> [<output.npy>]")
+        sys.exit()
+
+    start = time.perf_counter()
+    output = convertToNpy(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    convertTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    altitudes = loadElevation(output)
+    print("{} : {}x{} en {:.2f}s, relu en {:.3f}s".format(
+        output, altitudes.shape[0], altitudes.shape[1], convertTime, time.perf_counter() - start))
@@ -0,0 +1,121 @@
+import vtk
+import time
+
+'''
+Animation de la montée des eaux.
+
+L'altitude de chaque point est passée une fois au vertex shader comme attribut ;
+le fragment shader colorie en eau tout ce qui est sous le niveau courant, donné par
+un uniform. Changer de niveau ne modifie donc ni les points, ni les scalaires, ni
+la lookup table : une image ne coûte que le rendu, même sur un grand MNT.
+
+Clavier (mode interactif) : espace pause, flèches haut / bas vitesse x2 / ÷2,
+Home retour au niveau de départ.
+'''
+
+# durée (secondes) d'une montée complète en mode interactif
+DEFAULT_DURATION = 10.0
+
+# intervalle (ms) du timer, environ 60 images par seconde
+DEFAULT_INTERVAL = 16
+
+WATER_COLOR = (0.0, 0.0, 1.0)
+
+
+class FloodAnimation:
+
+    # actor dont le mapper a en entrée le tableau de points arrayName (altitudes)
+    def __init__(self, actor, arrayName, minLevel, maxLevel, duration=DEFAULT_DURATION):
+        self.actor = actor
+        self.minLevel = minLevel
+        self.maxLevel = maxLevel
+        self.duration = duration
+        self.paused = False
+        self.lastTick = None
+        self.timerId = None
+        self.renderWindow = None
+
+        actor.GetMapper().MapDataArrayToVertexAttribute(
+            "altitude", arrayName, vtk.vtkDataObject.FIELD_ASSOCIATION_POINTS, -1)
+
+        shaderProperty = actor.GetShaderProperty()
+        shaderProperty.AddVertexShaderReplacement(
+            "//VTK::Normal::Dec", True,
+            "//VTK::Normal::Dec\nin float altitude;\nout float altitudeVSOutput;\n", False)
+        shaderProperty.AddVertexShaderReplacement(
+            "//VTK::Normal::Impl", True,
+            "//VTK::Normal::Impl\n  altitudeVSOutput = altitude;\n", False)
+        shaderProperty.AddFragmentShaderReplacement(
+            "//VTK::Normal::Dec", True,
+            "//VTK::Normal::Dec\nin float altitudeVSOutput;\n", False)
+        shaderProperty.AddFragmentShaderReplacement(
+            "//VTK::Color::Impl", True,
+            "//VTK::Color::Impl\n"
+            "  if (altitudeVSOutput < floodLevel)\n"
+            "  {\n"
+            "    ambientColor = waterColor;\n"
+            "    diffuseColor = waterColor;\n"
+            "  }\n", False)
+        self.uniforms = shaderProperty.GetFragmentCustomUniforms()
+        self.uniforms.SetUniform3f("waterColor", WATER_COLOR)
+
+        self.textActor = vtk.vtkTextActor()
+        self.textActor.SetDisplayPosition(10, 10)
+        self.textActor.GetTextProperty().SetFontSize(18)
+        self.textActor.GetTextProperty().SetColor(1, 1, 1)
+
+        self.setLevel(minLevel)
+
+    def setLevel(self, level):
+        self.level = level
+        self.uniforms.SetUniformf("floodLevel", level)
+        self.textActor.SetInput("Niveau de l'eau : {:.0f}m".format(level))
+
+    # démarre le timer de l'interacteur et écoute le clavier
+    def attach(self, interactor, interval=DEFAULT_INTERVAL):
+        self.renderWindow = interactor.GetRenderWindow()
+        interactor.AddObserver("TimerEvent", self.tick)
+        interactor.AddObserver("KeyPressEvent", self.keyPress)
+        self.timerId = interactor.CreateRepeatingTimer(interval)
+
+    def tick(self, obj, event):
+        if obj.GetTimerEventId() != self.timerId:
+            return
+        now = time.perf_counter()
+        if self.paused:
+            self.lastTick = None
+            return
+        if self.lastTick is not None:
+            rise = (self.maxLevel - self.minLevel) * (now - self.lastTick) / self.duration
+            level = self.level + rise
+            # l'animation recommence une fois le niveau maximal atteint
+            self.setLevel(self.minLevel if level > self.maxLevel else level)
+        self.lastTick = now
+        self.renderWindow.Render()
+
+    def keyPress(self, obj, event):
+        key = obj.GetKeySym()
+        if key == "space":
+            self.paused = not self.paused
+        elif key == "Up":
+            self.duration /= 2
+        elif key == "Down":
+            self.duration *= 2
+        elif key == "Home":
+            self.setLevel(self.minLevel)
+        else:
+            return
+        self.renderWindow.Render()
+
+    # rend frames images du niveau minimal au niveau maximal dans une vidéo
+    def exportVideo(self, renderWindow, writer, frames):
+        w2i = vtk.vtkWindowToImageFilter()
+        w2i.SetInput(renderWindow)
+        writer.SetInputConnection(w2i.GetOutputPort())
+        writer.Start()
+        for frame in range(frames):
+            self.setLevel(self.minLevel + (self.maxLevel - self.minLevel) * frame / max(frames - 1, 1))
+            renderWindow.Render()
+            w2i.Modified()
+            writer.Write()
+        writer.End()
@@ -1,7 +1,13 @@
 import vtk
+import os
 import sys
+import time
 import numpy as np
-from math import pi
+from elevation import loadElevation
+from flood import FloodAnimation
+from geoterrain import (EARTH_RADIUS, regularTerrainPoints, demGrid, gridSurface,
+                        altitudeLookupTable, buildScalarBar, placeCamera, renderToFile,
+                        BackgroundWriter, windowPixels, createVideoWriter)
 
 # distance de la caméra en proportion du rayon de la terre
 distanceFactor = 1.085
@@ -14,7 +20,15 @@ DISCRETE = False
 OVERFLOW = False
 OVERFLOW_HEIGHT = 270
 
-EARTH_RADIUS = 6371009
+# nombre d'images de la vidéo de montée des eaux (--flood <vidéo>)
+FLOOD_FRAMES = 240
+
+# nombre de points adjacents de même altitude pour considérer que c'est plat
+LIMIT_FLAT = 5  # moins que 5 on commence a avoir trop de plats détéctés
+
+# surface minimale (en points) d'une zone plate connexe en 2D, en plus des suites
+# le long des lignes ; None pour ne pas l'utiliser (nécessite scipy)
+FLAT_MIN_AREA = None
 
 # longitudes et latitudes min et max de l'extrait de la carte
 MIN_LONG = 5.0
@@ -26,22 +40,146 @@ MEAN_LONG = np.mean([MIN_LONG, MAX_LONG])
 MEAN_LAT = np.mean([MIN_LAT, MAX_LAT])
 
 
-# transforme un angle en degrés vers des radians
-def angleToRad(angle):
-    return angle * pi / 180
+# longueur de la suite de valeurs égales qui contient chaque point, le long des lignes
+# (encodage par plages : débuts des suites par diff, numéro de suite par cumsum)
+def runLengths(altitudes):
+    starts = np.ones(altitudes.shape, dtype=bool)
+    starts[:, 1:] = np.diff(altitudes, axis=1) != 0
+    starts = starts.ravel()
+    lengths = np.diff(np.append(np.flatnonzero(starts), starts.size))
+    return lengths[np.cumsum(starts) - 1].reshape(altitudes.shape)
+
+
+# zones connexes (voisins haut, bas, gauche, droite de même altitude) d'au moins minArea points
+def flatRegions(altitudes, minArea):
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    index = np.arange(altitudes.size).reshape(altitudes.shape)
+    right = altitudes[:, 1:] == altitudes[:, :-1]
+    down = altitudes[1:, :] == altitudes[:-1, :]
+    first = np.concatenate((index[:, :-1][right], index[:-1, :][down]))
+    second = np.concatenate((index[:, 1:][right], index[1:, :][down]))
+    graph = coo_matrix((np.ones(len(first), dtype=np.int8), (first, second)),
+                       shape=(altitudes.size, altitudes.size))
+    _, labels = connected_components(graph, directed=False)
+    return (np.bincount(labels)[labels] >= minArea).reshape(altitudes.shape)
+
+
+# altitudes de la grille (int32, dans l'ordre des points) où les plats valent 1
+def flatScalars(altitudes, limit, minArea=None):
+    flat = runLengths(altitudes) >= limit
+    if minArea is not None:
+        flat |= flatRegions(altitudes, minArea)
+    return np.where(flat, 1, altitudes).astype(np.int32).ravel()
+
+
+# ancienne détection des plats, point par point avec un tampon circulaire, gardée
+# pour la comparaison (python map.py <fichier> --benchmark-flat)
+def legacyFlatScalars(arrayAltitudes, limit):
+    arrayAltitudes = arrayAltitudes.copy()
+    xSize, ySize = arrayAltitudes.shape
+    scalars = []
+    precedentValues = arrayAltitudes[0][:limit]
+    similars = False
+    lastValue = 0
+    counter = limit
+
+    # parcours la liste des points pour vérifier si c'est plat
+    for y in range(len(precedentValues), xSize * ySize):
+        currentValue = arrayAltitudes[y % xSize][y // xSize]
+        if not similars:
+            similars = True
+            # on considère plat si les len(precedentValues) précédentes valeurs sont identiques
+            for x in precedentValues:
+                if x != currentValue:
+                    similars = False
+                    break
+            # une valeur ancienne peut définitivement être coloriée
+            if counter >= len(precedentValues) and not similars:
+                scalars.append(arrayAltitudes[y % xSize][y // xSize])
+            # on a trouvé une ligne plate on colorie les ancienne valeur
+            elif similars:
+                counter = 0
+                for x in range(len(precedentValues)):
+                    scalars.append(arrayAltitudes[(y - x) % xSize][(y - x) // xSize])
+            counter += 1
+        # on a trouvé une ligne suffisement longue pour considérer ça comme plat
+        else:
+            # on colorie en bleu tant qu'on trouve des valeurs identiques
+            if lastValue == currentValue:
+                scalars.append(1)
+            # fin de la ligne plate on arrête de colorier en bleu
+            else:
+                similars = False
+                scalars.append(arrayAltitudes[y % xSize][y // xSize])
+        lastValue = currentValue
+        precedentValues[y % len(precedentValues)] = currentValue
+    return np.array(scalars)
 
 
 # on récupère le nom du fichier à traiter
+# python map.py <fichier> [--benchmark-flat] [--sweep <dossier> [<hauteur> ...]]
+#                          [--flood [<vidéo>]]
 if len(sys.argv) < 2:
     print("Missing argument : data filename")
     sys.exit()
 
-# on récupère les altitudes (la première ligne est ignorée)
-arrayAltitudes = np.loadtxt(sys.argv[1], dtype=int, skiprows=1, ndmin=2)
+# série d'images hors écran : continue et discrète pour chaque hauteur d'eau
+SWEEP = "--sweep" in sys.argv
+if SWEEP:
+    sweepIndex = sys.argv.index("--sweep")
+    if len(sys.argv) < sweepIndex + 2:
+        print("Missing argument : output directory")
+        sys.exit()
+    SWEEP_DIR = sys.argv[sweepIndex + 1]
+    # sans hauteur donnée, les 4 variantes des constantes DISCRETE et OVERFLOW
+    SWEEP_HEIGHTS = [int(height) for height in sys.argv[sweepIndex + 2:]] or [None, OVERFLOW_HEIGHT]
+
+# montée des eaux animée, dans la fenêtre ou exportée en vidéo hors écran
+FLOOD = "--flood" in sys.argv
+FLOOD_VIDEO = None
+if FLOOD:
+    floodIndex = sys.argv.index("--flood")
+    if len(sys.argv) > floodIndex + 1 and not sys.argv[floodIndex + 1].startswith("--"):
+        FLOOD_VIDEO = sys.argv[floodIndex + 1]
+
+# on récupère les altitudes : texte (la première ligne est ignorée), texte compressé,
+# .npy ou raster .bil / .hgt (voir elevation.py)
+arrayAltitudes = loadElevation(sys.argv[1])
 maxAltitude = np.amax(arrayAltitudes)
 minAltitude = np.amin(arrayAltitudes)
 xSize, ySize = arrayAltitudes.shape
-zSize = 1
+
+colorsArray = altitudeLookupTable(minAltitude, maxAltitude, DISCRETE)
+
+# le niveau de la mer monte jusqu'à OVERFLOW_HEIGHT, appliqué sur toute la grille
+# (pas pour une série d'images ou l'animation, où le niveau ne change que les couleurs)
+if OVERFLOW and not SWEEP and not FLOOD:
+    arrayAltitudes = np.maximum(arrayAltitudes, OVERFLOW_HEIGHT)
+
+# longitude pour chaque ligne, latitude pour chaque colonne, avec le pas d'origine
+lons = MIN_LONG + np.arange(ySize) * ((MAX_LONG - MIN_LONG) / xSize)
+lats = MIN_LAT + np.arange(xSize) * ((MAX_LAT - MIN_LAT) / ySize)
+
+# altitudes dans l'ordre des points de la grille (le point (x, y) est la ligne y, colonne x)
+gridAltitudes = arrayAltitudes[:ySize, :xSize]
+
+# compare la détection des plats avec l'ancienne boucle sur la grille complète
+if "--benchmark-flat" in sys.argv:
+    start = time.perf_counter()
+    flatScalars(gridAltitudes, LIMIT_FLAT)
+    vectorTime = time.perf_counter() - start
+    start = time.perf_counter()
+    legacyFlatScalars(arrayAltitudes, LIMIT_FLAT)
+    loopTime = time.perf_counter() - start
+    print("{} points : flatScalars {:.3f}s, boucle {:.3f}s (x{:.0f})".format(
+        gridAltitudes.size, vectorTime, loopTime, loopTime / vectorTime))
+    if FLAT_MIN_AREA is not None:
+        start = time.perf_counter()
+        flatScalars(gridAltitudes, LIMIT_FLAT, FLAT_MIN_AREA)
+        print("avec les zones 2D : {:.3f}s".format(time.perf_counter() - start))
+    sys.exit()
 
 '''
 On utilise une structuredGrid pour représenter nos données
@@ -50,111 +188,21 @@ dont la topologie est bien définie (nombre de points en largeur et en longueur)
 
 Elle nous permet de mettre les points à des hauteurs variable, mais il y a
 un seul point pour des coordonées x et y. La topologie est simplement définie
-par les dimensions
+par les dimensions. Les points sont calculés en une passe sur toute la grille
+(le point (x, y) est à l'indice y * xSize + x) et donnés à VTK sans copie.
 '''
-structuredGrid = vtk.vtkStructuredGrid()
-structuredGrid.SetDimensions([xSize, ySize, zSize])
+cartesianPoints = regularTerrainPoints(gridAltitudes, lats, lons, EARTH_RADIUS)
 
-'''
-Les couleurs ont été choisies pour afficher du vert
-en plaine tirant sur le blanc en passant par le jaune
-'''
-colorsArray = vtk.vtkLookupTable()
-colorsArray.SetRange(minAltitude, maxAltitude)
-colorsArray.SetValueRange(0.4, 1)
-colorsArray.SetHueRange(0.3, 0)
-colorsArray.SetSaturationRange(0.8, 0)
-colorsArray.SetNanColor(1, 1, 1, 1)
-colorsArray.SetScaleToLog10()
-colorsArray.SetBelowRangeColor(0, 0, 1, 1)
-colorsArray.SetUseBelowRangeColor(True)
-if DISCRETE:
-    colorsArray.SetNumberOfTableValues(7)
-colorsArray.Build()
-
-# liste des points de la structuredGrid
-points = vtk.vtkPoints()
-points.Allocate(xSize * ySize)
-
-# Scalars pour garder les altitudes tel quel en tant qu'attribut pour la coloration
-scalars = vtk.vtkIntArray()
-scalars.SetNumberOfComponents(1)
-
-# les points ont comme coordonnées de départ, l'altitude, longitude et latitude
-for lon, y in zip(np.arange(MIN_LONG, MAX_LONG, (MAX_LONG - MIN_LONG) / xSize), range(ySize)):
-    for lat, x in zip(np.arange(MIN_LAT, MAX_LAT, (MAX_LAT - MIN_LAT) / ySize), range(xSize)):
-
-        if OVERFLOW:
-            arrayAltitudes[y][x] = max(arrayAltitudes[y][x], OVERFLOW_HEIGHT)
-
-        alt = EARTH_RADIUS + arrayAltitudes[y][x]
-
-        points.InsertNextPoint(
-            alt,
-            angleToRad(lat),
-            angleToRad(lon)
-        )
-
-LIMIT_FLAT = 5  # nombre de points adjacents pour considérer que c'est plat
-
-precedentValues = arrayAltitudes[0][:LIMIT_FLAT]  # moins que 5 on commence a avoir trop de plats détéctés
-y = 0
-similars = False
-lastValue = 0
-counter = LIMIT_FLAT
-
-vtk.vtkSpheri
-
-# parcours la liste des points pour vérifier si c'est plat
-for y in range(len(precedentValues), xSize * ySize):
-    currentValue = arrayAltitudes[y % xSize][y // xSize]
-    if not similars:
-        similars = True
-        # on considère plat si les len(precedentValues) précédentes valeurs sont identiques
-        for x in precedentValues:
-            if x != currentValue:
-                similars = False
-                break
-        # une valeur ancienne peut définitivement être coloriée
-        if counter >= len(precedentValues) and not similars:
-            scalars.InsertNextValue(arrayAltitudes[y % xSize][y // xSize])
-        # on a trouvé une ligne plate on colorie les ancienne valeur
-        elif similars:
-            counter = 0
-            for x in range(len(precedentValues)):
-                scalars.InsertNextValue(arrayAltitudes[(y - x) % xSize][(y - x) // xSize])
-        counter += 1
-    # on a trouvé une ligne suffisement longue pour considérer ça comme plat
-    else:
-        # on colorie en bleu tant qu'on trouve des valeurs identiques
-        if lastValue == currentValue:
-            scalars.InsertNextValue(1)
-        # fin de la ligne plate on arrête de colorier en bleu
-        else:
-            similars = False
-            scalars.InsertNextValue(arrayAltitudes[y % xSize][y // xSize])
-    lastValue = currentValue
-    precedentValues[y % len(precedentValues)] = currentValue
+# altitudes gardées telles quelles pour la coloration, les plats (lacs) valent 1
+# et prennent la couleur sous la plage de la lookup table
+scalarsArray = flatScalars(gridAltitudes, LIMIT_FLAT, FLAT_MIN_AREA)
 
-structuredGrid.SetPoints(points)
-structuredGrid.GetPointData().SetScalars(scalars)
-
-geometryFilter = vtk.vtkStructuredGridGeometryFilter()
-geometryFilter.SetInputData(structuredGrid)
-
-'''
-application d'une transformation convertissant les altitudes latitudes et longitudes
-en coordonnées sur les axes orthogonaux
-'''
-tf = vtk.vtkSphericalTransform()
-transformFilter = vtk.vtkTransformPolyDataFilter()
-transformFilter.SetTransform(tf)
-transformFilter.SetInputConnection(geometryFilter.GetOutputPort())
-transformFilter.Update()
+structuredGrid = demGrid(cartesianPoints, (xSize, ySize), scalarsArray)
+structuredGrid.GetPointData().GetScalars().SetName("Altitudes")
 
 # mapper sur lequel on met la lookup table pour la coloration
 mapMapper = vtk.vtkPolyDataMapper()
-mapMapper.SetInputConnection(transformFilter.GetOutputPort())
+mapMapper.SetInputData(gridSurface(structuredGrid))
 mapMapper.ScalarVisibilityOn()
 mapMapper.SetScalarModeToUsePointData()
 mapMapper.SetColorModeToMapScalars()
@@ -164,55 +212,70 @@ mapMapper.SetScalarRange(OVERFLOW_HEIGHT if OVERFLOW else minAltitude, maxAltitu
 mapActor = vtk.vtkActor()
 mapActor.SetMapper(mapMapper)
 
+# l'eau est dessinée par le shader sous un niveau donné en uniform
+if FLOOD:
+    flood = FloodAnimation(mapActor, "Altitudes", minAltitude, maxAltitude)
+
 # légende pour la lookupTable
-scalarBar = vtk.vtkScalarBarActor()
-scalarBar.SetLookupTable(colorsArray)
-scalarBar.SetTitle("Altitudes")
-scalarBar.SetLabelFormat("%4.0f")
-scalarBar.SetNumberOfLabels(8)
-scalarBar.SetDrawBelowRangeSwatch(True)
-scalarBar.SetVerticalTitleSeparation(30)
-scalarBar.SetBelowRangeAnnotation("Water")
+scalarBar = buildScalarBar(colorsArray, "Altitudes", 8, "Water")
 
 ren1 = vtk.vtkRenderer()
 ren1.AddActor(mapActor)
-ren1.AddActor2D(scalarBar)
+ren1.AddActor(scalarBar)
 ren1.SetBackground(0.1, 0.2, 0.4)
+if FLOOD:
+    ren1.AddActor(flood.textActor)
 
 renWin = vtk.vtkRenderWindow()
 renWin.AddRenderer(ren1)
 renWin.SetSize(800, 600)
+if SWEEP or FLOOD_VIDEO:
+    renWin.OffScreenRenderingOn()
 
 renWin.Render()
 
 # caméra posée au dessus du centre de la carte
-cameraPosIn = [distanceFactor * EARTH_RADIUS, angleToRad(MEAN_LAT), angleToRad(MEAN_LONG)]
-cameraPosOut = [0, 0, 0]
-tf.TransformPoint(cameraPosIn, cameraPosOut)
-
-camera = vtk.vtkCamera()
-camera.SetPosition(cameraPosOut)
-camera.SetFocalPoint(mapActor.GetCenter())
-camera.Roll(-90)
-ren1.SetActiveCamera(camera)
-ren1.ResetCameraClippingRange()
+placeCamera(ren1, MEAN_LAT, MEAN_LONG, EARTH_RADIUS, distanceFactor, mapActor.GetCenter())
 
 renWin.Render()
 
+'''
+série d'images : la géométrie est construite une fois, seules la lookup table et
+la plage des scalaires changent (l'eau est sous la plage, affichée en bleu).
+Les PNG sont écrits par un thread pendant le rendu des images suivantes.
+'''
+if SWEEP:
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    lookupTables = {DISCRETE: colorsArray,
+                    not DISCRETE: altitudeLookupTable(minAltitude, maxAltitude, not DISCRETE)}
+    writer = BackgroundWriter()
+    for discrete in (False, True):
+        mapMapper.SetLookupTable(lookupTables[discrete])
+        scalarBar.SetLookupTable(lookupTables[discrete])
+        for height in SWEEP_HEIGHTS:
+            mapMapper.SetScalarRange(minAltitude if height is None else height, maxAltitude)
+            renWin.Render()
+
+            filename = "{0}{1}.png".format("" if height is None else "WithOverflow{}".format(height),
+                                           "Discrete" if discrete else "Continuous")
+            writer.submit(os.path.join(SWEEP_DIR, filename), windowPixels(renWin))
+            print(filename)
+    writer.close()
+    sys.exit()
+
+# vidéo de la montée des eaux, seul l'uniform du niveau change d'une image à l'autre
+if FLOOD_VIDEO:
+    start = time.perf_counter()
+    flood.exportVideo(renWin, createVideoWriter(FLOOD_VIDEO), FLOOD_FRAMES)
+    print("{} : {} images en {:.1f}s".format(FLOOD_VIDEO, FLOOD_FRAMES, time.perf_counter() - start))
+    sys.exit()
+
 # obtention de l'image
 
 overflowText = "WithOverflow" if OVERFLOW else ""
 tableTypeText = "Discrete" if DISCRETE else "Continuous"
 filename = "{0}{1}.png".format(overflowText, tableTypeText)
-
-w2i = vtk.vtkWindowToImageFilter()
-w2i.SetInput(renWin)
-w2i.Update()
-
-writer = vtk.vtkPNGWriter()
-writer.SetFileName(filename)
-writer.SetInputConnection(w2i.GetOutputPort())
-writer.Write()
+renderToFile(renWin, filename)
 
 iren = vtk.vtkRenderWindowInteractor()
 iren.SetRenderWindow(renWin)
@@ -220,5 +283,8 @@ iren.SetRenderWindow(renWin)
 style = vtk.vtkInteractorStyleTrackballCamera()
 iren.SetInteractorStyle(style)
 
+if FLOOD:
+    flood.attach(iren)
+
 iren.Initialize()
 iren.Start()
@@ -0,0 +1,181 @@
+import vtk
+import numpy as np
+from vtk.util import numpy_support
+
+'''
+Extraction de plusieurs isosurfaces d'un volume avec un seul filtre.
+
+vtkFlyingEdges3D calcule toutes les isovaleurs d'un coup, bien plus vite que deux
+vtkContourFilter, et garde en scalaires l'isovaleur de chaque point. Il ne fusionne
+pas les sommets confondus et garde les triangles dégénérés : quand un voxel vaut
+exactement l'isovaleur (fréquent sur des données entières), chaque arête qui y
+arrive crée son propre point. Seuls ces points, posés sur un sommet de la grille,
+sont fusionnés en NumPy (par leur indice dans la grille), ce qui redonne exactement
+le nombre de points et de triangles de vtkContourFilter ; on sépare ensuite une
+polydata (points, normales et triangles) par isovaleur.
+
+Temps et pic mémoire face à deux vtkContourFilter, volume complet et réduit :
+    python isosurfaces.py vw_knee.slc
+'''
+
+ID_TYPE = numpy_support.get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]
+
+# écart (en voxels) en dessous duquel un point est considéré sur un sommet de la grille
+VERTEX_TOLERANCE = 1e-3
+
+
+# isosurfaces du volume dans l'ordre de isovalues, avec les normales
+def extractIsosurfaces(volume, isovalues):
+    flyingEdges = vtk.vtkFlyingEdges3D()
+    flyingEdges.SetInputData(volume)
+    for index, isovalue in enumerate(isovalues):
+        flyingEdges.SetValue(index, isovalue)
+    flyingEdges.ComputeNormalsOn()
+    flyingEdges.ComputeScalarsOn()
+    flyingEdges.Update()
+    return splitIsosurfaces(flyingEdges.GetOutput(), isovalues, volume)
+
+
+# indice de chaque point après fusion des points posés sur un même sommet de la grille
+# du volume, et indices des points gardés (le premier de chaque groupe)
+def mergeVertexPoints(points, volume):
+    origin, spacing = volume.GetOrigin(), volume.GetSpacing()
+
+    # un axe à la fois pour ne pas garder plusieurs copies (N, 3) en float64
+    onVertex = np.ones(len(points), dtype=bool)
+    for axis in range(3):
+        grid = (points[:, axis] - origin[axis]) / spacing[axis]
+        onVertex &= np.abs(grid - np.rint(grid)) < VERTEX_TOLERANCE
+    onVertex = np.flatnonzero(onVertex)
+
+    representative = np.arange(len(points))
+    if len(onVertex):
+        # indice linéaire du sommet dans la grille, seulement pour ces points
+        vertex = np.rint((points[onVertex] - np.asarray(origin)) / np.asarray(spacing)).astype(np.int64)
+        vertex -= vertex.min(axis=0)
+        size = vertex.max(axis=0) + 1
+        keys = vertex[:, 0] + size[0] * (vertex[:, 1] + size[1] * vertex[:, 2])
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        representative[onVertex] = onVertex[first][inverse.ravel()]
+    kept = np.flatnonzero(representative == np.arange(len(points)))
+    newIndex = np.empty(len(points), dtype=np.int64)
+    newIndex[kept] = np.arange(len(kept))
+    return newIndex[representative], kept
+
+
+# sépare une sortie de vtkFlyingEdges3D (scalaires = isovaleur) en une polydata par isovaleur
+def splitIsosurfaces(polyData, isovalues, volume):
+    points = numpy_support.vtk_to_numpy(polyData.GetPoints().GetData())
+    normals = numpy_support.vtk_to_numpy(polyData.GetPointData().GetNormals())
+    values = numpy_support.vtk_to_numpy(polyData.GetPointData().GetScalars())
+    triangles = numpy_support.vtk_to_numpy(polyData.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+
+    merged, first = mergeVertexPoints(points, volume)
+    triangles = merged[triangles]
+    degenerate = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | \
+                 (triangles[:, 0] == triangles[:, 2])
+    triangles = triangles[~degenerate]
+
+    # isovaleur la plus proche de chaque point (les scalaires ont le type du volume)
+    distances = values[first, np.newaxis].astype(np.float64) - np.asarray(isovalues, dtype=np.float64)
+    labels = np.abs(distances).argmin(axis=1)
+    triangleLabels = labels[triangles[:, 0]]
+
+    surfaces = []
+    for index in range(len(isovalues)):
+        mask = labels == index
+        newIndex = np.cumsum(mask) - 1
+        connectivity = newIndex[triangles[triangleLabels == index]].astype(ID_TYPE).ravel()
+        offsets = np.arange(0, len(connectivity) + 1, 3, dtype=ID_TYPE)
+
+        surfacePoints = vtk.vtkPoints()
+        surfacePoints.SetData(numpy_support.numpy_to_vtk(points[first[mask]], deep=True))
+        polys = vtk.vtkCellArray()
+        polys.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=True),
+                      numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=True))
+        surfaceNormals = numpy_support.numpy_to_vtk(normals[first[mask]], deep=True)
+        surfaceNormals.SetName("Normals")
+
+        surface = vtk.vtkPolyData()
+        surface.SetPoints(surfacePoints)
+        surface.SetPolys(polys)
+        surface.GetPointData().SetNormals(surfaceNormals)
+        surfaces.append(surface)
+    return surfaces
+
+
+# une isosurface par vtkContourFilter, comme knee.py avant le passage unique
+def contourIsosurfaces(volume, isovalues):
+    surfaces = []
+    for isovalue in isovalues:
+        contour = vtk.vtkContourFilter()
+        contour.SetInputData(volume)
+        contour.SetValue(0, isovalue)
+        contour.ComputeScalarsOff()
+        contour.Update()
+        surfaces.append(contour.GetOutput())
+    return surfaces
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import multiprocessing
+
+    # pic de mémoire résidente (octets) depuis resetPeakMemory, Linux seulement
+    def resetPeakMemory():
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+
+    def memoryStatus(field):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def loadVolume(resample):
+        if len(sys.argv) > 1:
+            reader = vtk.vtkSLCReader()
+            reader.SetFileName(sys.argv[1])
+            reader.Update()
+            volume = reader.GetOutput()
+        else:
+            size = 256
+            z, y, x = np.mgrid[:size, :size, :size].astype(np.float32)
+            radius = np.sqrt((x - size / 2) ** 2 + (y - size / 2) ** 2)
+            values = np.clip(150 - 1.2 * radius + 6 * np.sin(z / 7) + 4 * np.cos(x / 5), 0, 255)
+            volume = vtk.vtkImageData()
+            volume.SetDimensions(size, size, size)
+            volume.GetPointData().SetScalars(
+                numpy_support.numpy_to_vtk(values.astype(np.uint8).ravel(), deep=True))
+        if not resample:
+            return volume
+        resampleFilter = vtk.vtkImageResample()
+        resampleFilter.SetInputData(volume)
+        resampleFilter.SetDimensionality(3)
+        resampleFilter.SetMagnificationFactors(0.5, 0.5, 0.5)
+        resampleFilter.Update()
+        return resampleFilter.GetOutput()
+
+    # mesure dans un processus à part pour que les pics ne se mélangent pas
+    def measure(arguments):
+        resample, extract = arguments
+        volume = loadVolume(resample)
+        resetPeakMemory()
+        before = memoryStatus("VmRSS")
+        start = time.perf_counter()
+        surfaces = extract(volume, [73, 40])
+        elapsed = time.perf_counter() - start
+        counts = [(surface.GetNumberOfPoints(), surface.GetNumberOfCells()) for surface in surfaces]
+        return volume.GetDimensions(), elapsed, memoryStatus("VmHWM") - before, counts
+
+    context = multiprocessing.get_context("fork")
+    for resample in (False, True):
+        for name, extract in (("2 x vtkContourFilter", contourIsosurfaces),
+                              ("vtkFlyingEdges3D", extractIsosurfaces)):
+            with context.Pool(1) as pool:
+                dimensions, elapsed, peak, counts = pool.map(measure, [(resample, extract)])[0]
+            print("{} {} : {:.3f}s, pic +{:.0f} Mio, os {} points {} triangles, peau {} points {} triangles".format(
+                "x".join(map(str, dimensions)), name, elapsed, peak / (1 << 20),
+                counts[0][0], counts[0][1], counts[1][0], counts[1][1]))
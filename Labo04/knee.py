@@ -2,13 +2,32 @@
 
 import vtk
 from math import pi
-import os.path
+from functools import lru_cache
+from surfacedistance import surfaceDistance
+from isosurfaces import extractIsosurfaces
+from pipelinecache import PipelineCache
 
-# Mettre à True pour forcer la génération du fichier pour l'affichage des distances (le fait si le fichier n'existe pas)
+# Mettre à True pour forcer le calcul des distances (fait aussi si le cache n'est pas valide)
 WRITE_FILE = False
 
 # Mettre à true pour utiliser ImageResample pour réduire la taille
 RESAMPLE = False
+RESAMPLE_FACTOR = 0.5
+
+KNEE_FILE = "vw_knee.slc"
+
+# isovaleurs des surfaces de l'os et de la peau
+BONE_ISOVALUE = 73
+SKIN_ISOVALUE = 40
+
+# calcul de la distance de l'os à la peau : "exact" (mêmes valeurs que le filtre, plus
+# rapide et réparti sur les coeurs), "approximate" (au sommet le plus proche, nécessite
+# scipy) ou "filter" (vtkDistancePolyDataFilter)
+DISTANCE_ENGINE = "exact"
+
+# dossier et taille maximale (octets) du cache des surfaces et des distances
+CACHE_DIR = "cache"
+CACHE_SIZE = 512 * 1024 * 1024
 
 BONE_COLOR = [0.9, 0.9, 0.9]
 SKIN_COLOR = [0.87, 0.675, 0.41]
@@ -25,44 +44,47 @@ def newRenderer(actors, background):
     renderer.ResetCamera()
     return renderer
 
-# on lit les données depuis le fichier pour créer un ensemble structuré de points (volume)
-reader = vtk.vtkSLCReader()
-reader.SetFileName("vw_knee.slc")
-reader.Update()
-
-if RESAMPLE:
-    KNEE_COLOR_FILE = "colorationBoneResampled.vtp"
+# on lit les données depuis le fichier pour créer un ensemble structuré de points (volume),
+# seulement si une des surfaces doit être recalculée
+@lru_cache(maxsize=None)
+def readVolume():
+    reader = vtk.vtkSLCReader()
+    reader.SetFileName(KNEE_FILE)
+    reader.Update()
+    if not RESAMPLE:
+        return reader.GetOutput()
 
     resample = vtk.vtkImageResample()
     resample.SetInputData(reader.GetOutput())
     resample.SetDimensionality(3)
-    resample.SetMagnificationFactors(0.5, 0.5, 0.5)
-
-    imageData = resample.GetOutputPort()
-else:
-    KNEE_COLOR_FILE = "colorationBone.vtp"
-    imageData = reader.GetOutputPort()
-
-# utulise le volume pour en faire une isosurface pour l'os
-boneSurface = vtk.vtkContourFilter()
-boneSurface.SetInputConnection(imageData)
-boneSurface.SetValue(0, 73)
-boneSurface.ComputeScalarsOff()
-boneSurface.Update()
-
-# utulise le volume pour en faire une isosurface pour la peau
-skinSurface = vtk.vtkContourFilter()
-skinSurface.SetInputConnection(imageData)
-skinSurface.SetValue(0, 40)
-skinSurface.ComputeScalarsOff()
-skinSurface.Update()
+    resample.SetMagnificationFactors(RESAMPLE_FACTOR, RESAMPLE_FACTOR, RESAMPLE_FACTOR)
+    resample.Update()
+    return resample.GetOutput()
+
+# utilise le volume pour en faire les isosurfaces de l'os et de la peau, en un seul passage
+@lru_cache(maxsize=None)
+def extractSurfaces():
+    return extractIsosurfaces(readVolume(), [BONE_ISOVALUE, SKIN_ISOVALUE])
+
+# les résultats sont gardés selon le contenu du fichier et les paramètres des filtres,
+# la clé de chaque étape entre dans celle des étapes suivantes
+cache = PipelineCache(CACHE_DIR, CACHE_SIZE)
+volumeKey = cache.key(volume=cache.fileDigest(KNEE_FILE), resample=RESAMPLE_FACTOR if RESAMPLE else None)
+surfacesKey = cache.key(volume=volumeKey, filter="vtkFlyingEdges3D",
+                        isovalues=[BONE_ISOVALUE, SKIN_ISOVALUE])
+boneKey = cache.key(surfaces=surfacesKey, surface="bone")
+skinKey = cache.key(surfaces=surfacesKey, surface="skin")
+
+# isosurfaces de l'os et de la peau
+boneSurface = cache.cached(boneKey, lambda: extractSurfaces()[0])
+skinSurface = cache.cached(skinKey, lambda: extractSurfaces()[1])
 
 # création des mappers
 boneMapper = vtk.vtkPolyDataMapper()
-boneMapper.SetInputConnection(boneSurface.GetOutputPort())
+boneMapper.SetInputData(boneSurface)
 
 skinMapper = vtk.vtkPolyDataMapper()
-skinMapper.SetInputConnection(skinSurface.GetOutputPort())
+skinMapper.SetInputData(skinSurface)
 
 # création des acteurs
 boneActor = vtk.vtkActor()
@@ -114,7 +136,7 @@ plane.SetNormal(0, 0, 1)
 
 cutter = vtk.vtkCutter()
 cutter.SetCutFunction(plane)
-cutter.SetInputConnection(skinSurface.GetOutputPort())
+cutter.SetInputData(skinSurface)
 cutter.GenerateValues(NUMBER_OF_RING, [0, zLength])
 cutter.Update()
 
@@ -155,7 +177,7 @@ sphere.SetRadius(50)
 sphere.SetCenter(xCenter, yCenter - 60, zCenter)
 
 clip = vtk.vtkClipPolyData()
-clip.SetInputConnection(skinSurface.GetOutputPort())
+clip.SetInputData(skinSurface)
 clip.SetClipFunction(sphere)
 clip.InsideOutOff()
 clip.GenerateClippedOutputOn()
@@ -191,30 +213,26 @@ clippedTransparentSkinActor.SetProperty(frontProp)
 clippedTransparentSkinActor.SetBackfaceProperty(backProp)
 
 # coloration de l'os selon la distance à la peau
-# utilise un fichier sauvegardé si disponible et non forcé à le réécrire
-if os.path.isfile(KNEE_COLOR_FILE) and not(WRITE_FILE):
-    vtkReader = vtk.vtkXMLPolyDataReader()
-    vtkReader.SetFileName(KNEE_COLOR_FILE)
-    vtkReader.Update()
-    boneFilter = vtkReader
-else: 
+def boneDistance():
+    if DISTANCE_ENGINE != "filter":
+        return surfaceDistance(boneSurface, skinSurface, DISTANCE_ENGINE == "exact")
     boneFilter = vtk.vtkDistancePolyDataFilter()
-    boneFilter.SetInputConnection(0, boneSurface.GetOutputPort())
-    boneFilter.SetInputConnection(1, skinSurface.GetOutputPort())
+    boneFilter.SetInputData(0, boneSurface)
+    boneFilter.SetInputData(1, skinSurface)
     boneFilter.Update()
+    return boneFilter.GetOutput()
 
-    vtkWriter = vtk.vtkXMLPolyDataWriter()
-    vtkWriter.SetInputData(boneFilter.GetOutput())
-    vtkWriter.SetFileName(KNEE_COLOR_FILE)
-    vtkWriter.Write()
+# relue depuis le cache si déjà calculée avec ces surfaces et non forcée à être recalculée
+distanceKey = cache.key(bone=boneKey, skin=skinKey, engine=DISTANCE_ENGINE)
+coloredBone = cache.cached(distanceKey, boneDistance, refresh=WRITE_FILE)
 
 colorsArray = vtk.vtkLookupTable()
 colorsArray.SetHueRange(0.8, 0)
 colorsArray.Build()
 
 distanceMapper = vtk.vtkPolyDataMapper()
-distanceMapper.SetInputConnection(boneFilter.GetOutputPort() )
-distanceMapper.SetScalarRange(boneFilter.GetOutput().GetPointData().GetScalars().GetRange()[0], boneFilter.GetOutput().GetPointData().GetScalars().GetRange()[1])
+distanceMapper.SetInputData(coloredBone)
+distanceMapper.SetScalarRange(coloredBone.GetPointData().GetScalars().GetRange())
 distanceMapper.SetLookupTable(colorsArray)
 
 coloredBoneActor = vtk.vtkActor()
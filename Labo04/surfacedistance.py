@@ -0,0 +1,150 @@
+import os
+import sys
+import vtk
+import numpy as np
+import multiprocessing
+from vtk.util import numpy_support
+
+'''
+Distance signée des points d'une surface à une autre (de l'os à la peau).
+
+vtkDistancePolyDataFilter calcule en plus la distance inverse (peau vers os) et
+celle des centres des cellules, que knee.py n'affiche pas : c'est l'essentiel de
+son temps. Ici la surface cible est préparée une fois et tous les points sont
+interrogés d'un bloc :
+ - exact : distance point-triangle par vtkImplicitPolyDataDistance (les mêmes
+   valeurs que le filtre), les points étant répartis entre plusieurs processus
+   quand le système sait les créer par fork (pas sous Windows, et fork n'est pas
+   sûr avec VTK sous macOS) ; sinon tout est calculé dans le processus courant.
+   Un vtkStaticCellLocator interrogé point par point s'est montré plus lent pour
+   des points aussi loin de la surface ;
+ - approché : distance au sommet le plus proche de la cible (cKDTree de SciPy),
+   le signe venant de la normale en ce sommet. L'erreur est au plus de la taille
+   des triangles.
+'''
+
+# nombre de points en dessous duquel le calcul exact reste dans le processus courant
+MIN_POINTS_PER_WORKER = 5000
+
+# fonction distance de la surface cible, héritée par les processus (fork)
+workerScene = {}
+
+
+def _exactChunk(bounds):
+    start, stop = bounds
+    points = vtk.vtkPoints()
+    points.SetData(numpy_support.numpy_to_vtk(workerScene["points"][start:stop], deep=True))
+    values = vtk.vtkDoubleArray()
+    workerScene["distance"].FunctionValue(points.GetData(), values)
+    return numpy_support.vtk_to_numpy(values).copy()
+
+
+# distances exactes (N,) des points (N, 3) à la surface target
+def exactDistances(points, target, workers=None):
+    distance = vtk.vtkImplicitPolyDataDistance()
+    distance.SetInput(target)
+    workerScene["distance"] = distance
+    workerScene["points"] = np.ascontiguousarray(points, dtype=np.float64)
+
+    # les processus héritent de la fonction distance, ce qui demande fork
+    if sys.platform == "darwin" or "fork" not in multiprocessing.get_all_start_methods():
+        workers = 1
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(points) // MIN_POINTS_PER_WORKER))
+    cuts = np.linspace(0, len(points), workers + 1).astype(np.int64)
+    chunks = list(zip(cuts[:-1], cuts[1:]))
+    try:
+        if workers == 1:
+            return np.concatenate([_exactChunk(chunk) for chunk in chunks])
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            return np.concatenate(pool.map(_exactChunk, chunks))
+    finally:
+        workerScene.clear()
+
+
+# distances au sommet le plus proche de target, signées selon la normale en ce sommet
+def approximateDistances(points, target, workers=None):
+    from scipy.spatial import cKDTree
+
+    normals = target.GetPointData().GetNormals()
+    if normals is None:
+        normalsFilter = vtk.vtkPolyDataNormals()
+        normalsFilter.SetInputData(target)
+        normalsFilter.SplittingOff()
+        normalsFilter.Update()
+        normals = normalsFilter.GetOutput().GetPointData().GetNormals()
+
+    vertices = numpy_support.vtk_to_numpy(target.GetPoints().GetData()).astype(np.float64)
+    normals = numpy_support.vtk_to_numpy(normals)
+    distances, nearest = cKDTree(vertices).query(points, workers=workers or -1)
+    outside = np.einsum('ij,ij->i', points - vertices[nearest], normals[nearest])
+    return np.where(outside < 0, -distances, distances)
+
+
+# copie de source avec la distance signée de chaque point à target en scalaires "Distance",
+# comme la sortie de vtkDistancePolyDataFilter
+def surfaceDistance(source, target, exact=True, workers=None):
+    points = numpy_support.vtk_to_numpy(source.GetPoints().GetData()).astype(np.float64)
+    if exact:
+        distances = exactDistances(points, target, workers)
+    else:
+        distances = approximateDistances(points, target, workers)
+
+    output = vtk.vtkPolyData()
+    output.ShallowCopy(source)
+    scalars = numpy_support.numpy_to_vtk(distances, deep=True)
+    scalars.SetName("Distance")
+    output.GetPointData().SetScalars(scalars)
+    return output
+
+
+# temps du filtre et des deux modes sur le genou (python surfacedistance.py vw_knee.slc),
+# ou sur un volume synthétique
+if __name__ == "__main__":
+    import time
+
+    if len(sys.argv) > 1:
+        reader = vtk.vtkSLCReader()
+        reader.SetFileName(sys.argv[1])
+        reader.Update()
+        volume = reader.GetOutput()
+    else:
+        size = 160
+        z, y, x = np.mgrid[:size, :size, :size].astype(np.float32)
+        radius = np.sqrt((x - size / 2) ** 2 + (y - size / 2) ** 2)
+        values = np.clip(120 - 1.6 * radius + 6 * np.sin(z / 7) + 4 * np.cos(x / 5), 0, 255)
+        volume = vtk.vtkImageData()
+        volume.SetDimensions(size, size, size)
+        volume.GetPointData().SetScalars(numpy_support.numpy_to_vtk(values.astype(np.uint8).ravel(), deep=True))
+
+    def contour(isovalue):
+        contourFilter = vtk.vtkContourFilter()
+        contourFilter.SetInputData(volume)
+        contourFilter.SetValue(0, isovalue)
+        contourFilter.ComputeScalarsOff()
+        contourFilter.Update()
+        return contourFilter.GetOutput()
+
+    bone, skin = contour(73), contour(40)
+    print("os {} points, peau {} triangles".format(bone.GetNumberOfPoints(), skin.GetNumberOfCells()))
+
+    start = time.perf_counter()
+    distanceFilter = vtk.vtkDistancePolyDataFilter()
+    distanceFilter.SetInputData(0, bone)
+    distanceFilter.SetInputData(1, skin)
+    distanceFilter.Update()
+    filterTime = time.perf_counter() - start
+    reference = numpy_support.vtk_to_numpy(distanceFilter.GetOutput().GetPointData().GetScalars())
+    print("vtkDistancePolyDataFilter : {:.2f}s".format(filterTime))
+
+    cpus = os.cpu_count() or 1
+    modes = [("exact, 1 processus", True, 1), ("approché", False, None)]
+    if cpus > 1:
+        modes.insert(1, ("exact, {} processus".format(cpus), True, cpus))
+    for name, exact, workers in modes:
+        start = time.perf_counter()
+        result = surfaceDistance(bone, skin, exact, workers)
+        elapsed = time.perf_counter() - start
+        error = np.abs(numpy_support.vtk_to_numpy(result.GetPointData().GetScalars()) - reference)
+        print("{} : {:.2f}s (x{:.1f}), écart max {:.4f}, moyen {:.4f}".format(
+            name, elapsed, filterTime / elapsed, error.max(), error.mean()))
@@ -0,0 +1,109 @@
+import time
+import vtk
+import numpy as np
+from math import pi
+from vtk.util import numpy_support
+from geoterrain import POLAR_RADIUS, geoToSpherical, terrainCoordinates, buildTerrainGrid
+from quadmap import QuadMapper
+from projection import transform, SWEDISH_CRS, GLOBAL_CRS
+
+'''
+Vérifie que la construction vectorisée du terrain (geoterrain.terrain) donne la
+même grille que l'ancienne double boucle de planeur.py.
+
+L'ancienne boucle stockait les coordonnées sphériques (rayon, latitude, longitude)
+dans des vtkPoints en float32 : elles sont comparées exactement aux coordonnées
+sphériques de la version vectorisée, avant la conversion en cartésien. Les points
+cartésiens ne peuvent être comparés qu'à l'arrondi float32 près des anciennes
+coordonnées (un demi-mètre sur le rayon terrestre), l'écart maximal est affiché.
+La fenêtre est celle de planeur.py (coordonnées suédoises autour de 63°N, 13°E,
+même projection et même QuadMapper pour la texture), sur un terrain aléatoire.
+
+    python checkterrain.py
+'''
+
+
+# ancienne construction point par point (coordonnées sphériques)
+def legacyTerrainGrid(mapData, lonRange, latRange, xRange, yRange,
+                      project, toTexture, earthRadius, lonAdapt):
+    minX, maxX = xRange
+    minY, maxY = yRange
+
+    structuredGrid = vtk.vtkStructuredGrid()
+    structuredGrid.SetDimensions([maxY - minY, maxX - minX, 1])
+
+    points = vtk.vtkPoints()
+    scalars = vtk.vtkFloatArray()
+    scalars.SetNumberOfComponents(2)
+    scalarsAlt = vtk.vtkIntArray()
+    scalarsAlt.SetNumberOfComponents(1)
+
+    for lon, x in zip(np.linspace(lonRange[0], lonRange[1], maxX - minX), range(minX, maxX)):
+        for lat, y in zip(np.linspace(latRange[0], latRange[1], maxY - minY)[::-1], range(minY, maxY)):
+            alt = earthRadius + float(mapData[y][x])
+            newLon, newLat = project(lon, lat)
+            points.InsertNextPoint(alt, newLat * pi / 180, newLon * lonAdapt * pi / 180)
+            scalars.InsertNextTuple([float(v) for v in toTexture(lon, lat)])
+            scalarsAlt.InsertNextValue(int(mapData[y][x]))
+
+    structuredGrid.SetPoints(points)
+    structuredGrid.GetPointData().SetTCoords(scalars)
+    structuredGrid.GetPointData().SetScalars(scalarsAlt)
+    return structuredGrid
+
+
+# coins de la carte de planeur.py (HG = Haut Gauche, BD = Bas Droite)
+xHG, yHG = 1349340, 7022573
+xHD, yHD = 1371573, 7022967
+xBG, yBG = 1349602, 7005969
+xBD, yBD = 1371835, 7006362
+
+quadMapper = QuadMapper([xHG, xHD, xBD, xBG], [yBD, yBG, yHG, yHD])
+
+
+def project(x, y):
+    return transform(SWEDISH_CRS, GLOBAL_CRS, x, y)
+
+
+def toTexture(x, y):
+    l, m = quadMapper.inverse(x, y)
+    return l, 1 - m
+
+
+if __name__ == "__main__":
+    rng = np.random.RandomState(0)
+    mapData = rng.randint(-20, 2000, size=(300, 300)).astype(np.int16)
+
+    lonRange = (min(xHG, xBG), max(xHD, xBD))
+    latRange = (max(yHD, yHG), min(yBD, yBG))
+    window = (mapData, lonRange, latRange, (40, 140), (60, 180), project, toTexture)
+    earthRadius, lonAdapt = POLAR_RADIUS, 0.5
+
+    start = time.perf_counter()
+    fast = buildTerrainGrid(*window, earthRadius, lonAdapt)
+    fastTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    slow = legacyTerrainGrid(*window, earthRadius, lonAdapt)
+    slowTime = time.perf_counter() - start
+
+    pd = numpy_support.vtk_to_numpy
+
+    # coordonnées sphériques de la version vectorisée, arrondies comme dans les vtkPoints
+    lats, lons, _, altitudes = terrainCoordinates(*window)
+    spherical = np.stack(geoToSpherical(lats, lons, altitudes, earthRadius, lonAdapt), axis=-1)
+    assert np.array_equal(spherical.astype(np.float32), pd(slow.GetPoints().GetData()))
+    assert np.array_equal(pd(fast.GetPointData().GetTCoords()), pd(slow.GetPointData().GetTCoords()))
+    assert np.array_equal(pd(fast.GetPointData().GetScalars()), pd(slow.GetPointData().GetScalars()))
+    assert fast.GetExtent() == slow.GetExtent()
+
+    # l'ancienne grille passe encore par vtkSphericalTransform
+    sphericalTransform = vtk.vtkSphericalTransform()
+    slowPoints = vtk.vtkPoints()
+    sphericalTransform.TransformPoints(slow.GetPoints(), slowPoints)
+    error = np.abs(pd(fast.GetPoints().GetData()) - pd(slowPoints.GetData())).max()
+    assert error <= 1.0
+
+    print("coordonnées sphériques, texture et altitudes identiques, points cartésiens à {:.3f}m "
+          "au plus (arrondi float32 de l'ancienne version)".format(error))
+    print("vectorisé {:.4f}s, boucle {:.4f}s".format(fastTime, slowTime))
@@ -0,0 +1,132 @@
+import numpy as np
+from collections import namedtuple
+
+'''
+Lecture rapide des traces GPS au format de vtkgps.txt :
+
+    T 1361700 7013468    512.5 03/17/02_10:35:35 0      816       78    0.0
+
+Les lignes sont lues par blocs et découpées en colonnes NumPy (x et y en int32,
+altitude en float32, temps en secondes epoch int64). Les dates (mois/année/jour)
+sont converties de façon vectorisée, sans strptime par ligne. iterTrack permet de
+traiter des fichiers plus grands que la mémoire bloc par bloc.
+'''
+
+# nombre de colonnes d'une ligne de position
+FIELDS_PER_LINE = 9
+
+# nombre de lignes lues à la fois
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+# longueur de la date "mm/yy/dd_HH:MM:SS"
+DATE_LENGTH = 17
+
+Track = namedtuple('Track', ['x', 'y', 'altitude', 'time'])
+
+
+# séparateurs attendus (position dans la date), les autres caractères sont des chiffres
+DATE_SEPARATORS = {2: b'/', 5: b'/', 8: b'_', 11: b':', 14: b':'}
+
+
+# convertit des dates "mm/yy/dd_HH:MM:SS" (tableau de bytes) en secondes epoch,
+# ValueError si une date n'a pas ce format
+def parseDates(dates):
+    dates = np.asarray(dates, dtype=bytes)
+    wrongLength = np.char.str_len(dates) != DATE_LENGTH
+    if wrongLength.any():
+        raise ValueError("Malformed GPS date : " + repr(bytes(dates[wrongLength][0])))
+    characters = np.ascontiguousarray(dates, dtype='S%d' % DATE_LENGTH).view(np.uint8)
+    characters = characters.reshape(-1, DATE_LENGTH)
+
+    expected = np.full(DATE_LENGTH, -1)
+    for column, separator in DATE_SEPARATORS.items():
+        expected[column] = ord(separator)
+    isDigit = (characters >= ord('0')) & (characters <= ord('9'))
+    valid = np.where(expected >= 0, characters == expected, isDigit).all(axis=1)
+
+    digits = characters.astype(np.int64) - ord('0')
+
+    def number(column):
+        return digits[:, column] * 10 + digits[:, column + 1]
+
+    month, year, day = number(0), number(3), number(6)
+    hours, minutes, seconds = number(9), number(12), number(15)
+
+    # même pivot que strptime (%y) : 69-99 pour 1969-1999, 00-68 pour 2000-2068
+    year = year + np.where(year < 69, 2000, 1900)
+
+    months = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + \
+        (month - 1).astype('timedelta64[M]')
+    days = months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+
+    # jour hors du mois (ex: 02/03/30) ou heure hors plage refusés comme par datetime.strptime
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (days.astype('datetime64[M]') == months)
+    valid &= (hours < 24) & (minutes < 60) & (seconds < 60)
+    if not valid.all():
+        raise ValueError("Malformed GPS date : " + repr(bytes(dates[~valid][0])))
+    return days.astype(np.int64) * 86400 + hours * 3600 + minutes * 60 + seconds
+
+
+# découpe un bloc de lignes (bytes) en colonnes
+def parseLines(lines):
+    tokens = np.array(b' '.join(lines).split())
+    if tokens.size != len(lines) * FIELDS_PER_LINE:
+        raise ValueError("Malformed GPS line in block starting with : " + repr(lines[0]))
+    tokens = tokens.reshape(len(lines), FIELDS_PER_LINE)
+
+    return Track(
+        tokens[:, 1].astype(np.int32),
+        tokens[:, 2].astype(np.int32),
+        tokens[:, 3].astype(np.float32),
+        parseDates(tokens[:, 4])
+    )
+
+
+# générateur de blocs de la trace, la ligne d'en-tête est ignorée
+def iterTrack(path, chunkSize=DEFAULT_CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        lines = []
+        for line in f:
+            if line.startswith(b'T'):
+                lines.append(line)
+                if len(lines) == chunkSize:
+                    yield parseLines(lines)
+                    lines = []
+        if lines:
+            yield parseLines(lines)
+
+
+# lit toute la trace en colonnes
+def readTrack(path, chunkSize=DEFAULT_CHUNK_SIZE):
+    chunks = list(iterTrack(path, chunkSize))
+    if not chunks:
+        return Track(np.empty(0, np.int32), np.empty(0, np.int32),
+                     np.empty(0, np.float32), np.empty(0, np.int64))
+    return Track(*(np.concatenate(column) for column in zip(*chunks)))
+
+
+# compare avec genfromtxt + strptime sur un fichier donné en argument
+if __name__ == "__main__":
+    import sys
+    import time
+    from datetime import datetime, timezone
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "vtkgps.txt"
+
+    start = time.perf_counter()
+    track = readTrack(path)
+    fastTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference = np.genfromtxt(path, dtype=[('x', 'i4'), ('y', 'i4'), ('alt', 'f4'), ('date', 'U30')],
+                              usecols=(1, 2, 3, 4), skip_header=1, encoding='utf-8')
+    referenceTimes = [datetime.strptime(date, '%m/%y/%d_%H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+                      for date in reference['date']]
+    slowTime = time.perf_counter() - start
+
+    assert np.array_equal(track.x, reference['x'])
+    assert np.array_equal(track.y, reference['y'])
+    assert np.array_equal(track.altitude, reference['alt'])
+    assert np.array_equal(track.time, referenceTimes)
+    print("{} positions : readTrack {:.4f}s, genfromtxt + strptime {:.4f}s".format(
+        len(track.x), fastTime, slowTime))
@@ -0,0 +1,186 @@
+import threading
+import vtk
+import numpy as np
+from collections import OrderedDict
+from vtk.util import numpy_support
+from trackmesh import ID_TYPE
+
+'''
+Isolignes d'altitude précalculées.
+
+Les contours sont calculés par marching squares directement dans l'espace de la
+grille (tableau des altitudes de la fenêtre), les points étant interpolés entre
+les points 3D du terrain déjà transformé. Chaque niveau est gardé dans un cache
+LRU ; au survol, on remplace simplement le contour affiché, aucun filtre VTK n'est
+réexécuté. Le précalcul de tous les niveaux peut tourner dans un thread pendant
+que la fenêtre est déjà interactive.
+'''
+
+# nombre de niveaux gardés en mémoire par défaut
+DEFAULT_CACHE_SIZE = 4096
+
+# segments (paires d'arêtes) pour chaque cas du marching squares
+# arêtes : 0 bas, 1 droite, 2 haut, 3 gauche ; coins : 0 bas-gauche, 1 bas-droite,
+# 2 haut-droite, 3 haut-gauche. Les cas 16 et 17 sont les selles 5 et 10 dont le
+# centre est au-dessus du niveau.
+SEGMENTS = {
+    1: [(3, 0)], 2: [(0, 1)], 3: [(3, 1)], 4: [(1, 2)],
+    5: [(3, 0), (1, 2)], 6: [(0, 2)], 7: [(3, 2)], 8: [(2, 3)],
+    9: [(0, 2)], 10: [(0, 1), (2, 3)], 11: [(1, 2)], 12: [(3, 1)],
+    13: [(0, 1)], 14: [(3, 0)],
+    16: [(0, 1), (2, 3)], 17: [(3, 0), (1, 2)],
+}
+
+
+# contour d'un niveau : points (M, 3) et connectivité des segments (2 * S)
+def marchingSquares(altitudes, points, level):
+    rows, cols = altitudes.shape
+    above = altitudes >= level
+
+    case = (above[:-1, :-1].astype(np.uint8) | (above[:-1, 1:] << 1) |
+            (above[1:, 1:] << 2) | (above[1:, :-1] << 3))
+
+    # levée d'ambiguïté des selles par la moyenne des 4 coins
+    center = (altitudes[:-1, :-1] + altitudes[:-1, 1:] +
+              altitudes[1:, 1:] + altitudes[1:, :-1]) / 4.0 >= level
+    case[(case == 5) & center] = 16
+    case[(case == 10) & center] = 17
+
+    # numéros globaux des arêtes : horizontales puis verticales
+    horizontalCount = rows * (cols - 1)
+    r, c = np.divmod(np.arange((rows - 1) * (cols - 1)), cols - 1)
+    r = r.reshape(case.shape)
+    c = c.reshape(case.shape)
+    cellEdges = [r * (cols - 1) + c,
+                 horizontalCount + r * cols + c + 1,
+                 (r + 1) * (cols - 1) + c,
+                 horizontalCount + r * cols + c]
+
+    segments = []
+    for caseIndex, pairs in SEGMENTS.items():
+        mask = case == caseIndex
+        if not mask.any():
+            continue
+        for first, second in pairs:
+            segments.append(np.stack((cellEdges[first][mask], cellEdges[second][mask]), axis=1))
+
+    if not segments:
+        return np.empty((0, 3), dtype=np.float32), np.empty(0, dtype=ID_TYPE)
+
+    edges, connectivity = np.unique(np.concatenate(segments).ravel(), return_inverse=True)
+
+    # extrémités (indices à plat) de chaque arête utilisée
+    horizontal = edges < horizontalCount
+    start = np.where(horizontal,
+                     (edges // (cols - 1)) * cols + edges % (cols - 1),
+                     edges - horizontalCount)
+    end = start + np.where(horizontal, 1, cols)
+
+    flatAltitudes = altitudes.ravel()
+    flatPoints = points.reshape(-1, 3)
+    a0 = flatAltitudes[start]
+    a1 = flatAltitudes[end]
+    t = (level - a0) / (a1 - a0)
+
+    # un sommet exactement au niveau (altitudes entières) donne le même point sur chacune
+    # de ses arêtes : ces points sont fusionnés, puis les segments dégénérés ou en double
+    # retirés, comme le fait vtkContourFilter
+    vertices = np.where(t == 0, start, np.where(t == 1, end, -1))
+    keys = np.where(vertices >= 0, vertices, rows * cols + edges)
+    _, first, merged = np.unique(keys, return_index=True, return_inverse=True)
+    pairs = merged.ravel()[connectivity].reshape(-1, 2)
+    pairs = np.unique(np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1), axis=0)
+
+    start, end, t = start[first], end[first], t[first, np.newaxis]
+    contourPoints = flatPoints[start] + t * (flatPoints[end] - flatPoints[start])
+
+    return contourPoints.astype(np.float32), pairs.ravel().astype(ID_TYPE)
+
+
+class IsolineEngine:
+
+    # altitudes (lignes, colonnes) et points 3D correspondants (lignes, colonnes, 3)
+    def __init__(self, altitudes, points, step=1, cacheSize=DEFAULT_CACHE_SIZE):
+        self.altitudes = np.asarray(altitudes, dtype=np.float64)
+        self.points = np.asarray(points, dtype=np.float64)
+        self.step = step
+        self.cacheSize = cacheSize
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopEvent = threading.Event()
+
+        # polydata affiché, son contenu est remplacé à chaque changement de niveau
+        self.output = vtk.vtkPolyData()
+        self.currentLevel = None
+        self.shownArrays = None
+
+    # niveaux couverts par le terrain
+    def levels(self):
+        first = np.ceil(self.altitudes.min() / self.step) * self.step
+        last = np.floor(self.altitudes.max() / self.step) * self.step
+        return np.arange(first, last + self.step / 2, self.step)
+
+    def quantize(self, altitude):
+        return float(round(altitude / self.step) * self.step)
+
+    # contour d'un niveau, depuis le cache ou calculé à la demande
+    def contour(self, level):
+        level = self.quantize(level)
+        with self.lock:
+            if level in self.cache:
+                self.cache.move_to_end(level)
+                return self.cache[level]
+
+        result = marchingSquares(self.altitudes, self.points, level)
+
+        with self.lock:
+            self.cache[level] = result
+            self.cache.move_to_end(level)
+            while len(self.cache) > self.cacheSize:
+                self.cache.popitem(last=False)
+        return result
+
+    # remplace le contour affiché dans output
+    def show(self, altitude):
+        level = self.quantize(altitude)
+        if level == self.currentLevel:
+            return
+        self.currentLevel = level
+
+        points, connectivity = self.contour(level)
+        vtkPoints = vtk.vtkPoints()
+        vtkPoints.SetData(numpy_support.numpy_to_vtk(points, deep=False))
+
+        offsets = np.arange(0, len(connectivity) + 1, 2, dtype=ID_TYPE)
+        lines = vtk.vtkCellArray()
+        lines.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=False),
+                      numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=False))
+
+        polyData = vtk.vtkPolyData()
+        polyData.SetPoints(vtkPoints)
+        polyData.SetLines(lines)
+        self.output.ShallowCopy(polyData)
+
+        # garde les tableaux partagés avec VTK en vie même s'ils quittent le cache
+        self.shownArrays = (points, connectivity, offsets)
+
+    # calcule tous les niveaux dans un thread en arrière-plan
+    def startPrecompute(self):
+        if self.thread is not None:
+            return
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self.precompute, daemon=True)
+        self.thread.start()
+
+    def stopPrecompute(self):
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def precompute(self):
+        for level in self.levels()[:self.cacheSize]:
+            if self.stopEvent.is_set():
+                return
+            self.contour(level)
@@ -0,0 +1,65 @@
+import numpy as np
+
+'''
+Cinématique du vol calculée sur toute la trace à la fois.
+
+Les fonctions prennent les colonnes de la trace (voir gpstrack) : positions en
+mètres (norme suédoise), altitudes en mètres et temps en secondes. La première
+position n'ayant pas de précédente, sa valeur est fixée par le paramètre first.
+Un intervalle de temps nul donne NaN, affiché avec la NanColor de la lookup table.
+'''
+
+
+# différence avec la position précédente divisée par le temps écoulé
+def _rate(delta, time, first):
+    dt = np.diff(np.asarray(time, dtype=np.float64))
+    rate = np.empty(len(delta) + 1, dtype=np.float64)
+    rate[0] = first
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate[1:] = np.where(dt > 0, delta / dt, np.nan)
+    return rate
+
+
+# vitesse verticale (m/s)
+def verticalSpeed(altitude, time, first=1.0):
+    return _rate(np.diff(np.asarray(altitude, dtype=np.float64)), time, first)
+
+
+# vitesse sol (m/s)
+def groundSpeed(x, y, time, first=0.0):
+    dx = np.diff(np.asarray(x, dtype=np.float64))
+    dy = np.diff(np.asarray(y, dtype=np.float64))
+    return _rate(np.hypot(dx, dy), time, first)
+
+
+# cap en degrés depuis le nord (y croissant), dans le sens horaire
+def heading(x, y, first=0.0):
+    dx = np.diff(np.asarray(x, dtype=np.float64))
+    dy = np.diff(np.asarray(y, dtype=np.float64))
+    result = np.empty(len(dx) + 1, dtype=np.float64)
+    result[0] = first
+    result[1:] = np.degrees(np.arctan2(dx, dy)) % 360
+    return result
+
+
+# moyenne glissante centrée sur window positions, les NaN sont ignorés
+def smooth(values, window):
+    values = np.asarray(values, dtype=np.float64)
+    if window <= 1 or len(values) == 0:
+        return values.copy()
+    valid = ~np.isnan(values)
+    kernel = np.ones(window)
+    sums = np.convolve(np.where(valid, values, 0), kernel, mode='same')
+    counts = np.convolve(valid.astype(np.float64), kernel, mode='same')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sums / counts
+
+
+# bornes de la lookup table : valeurs aux rangs low et high de la trace triée,
+# obtenues par sélection partielle au lieu d'un tri complet
+def percentileRange(values, low=0.1, high=0.9):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    ranks = [int(len(values) * low), min(int(len(values) * high), len(values) - 1)]
+    selected = np.partition(values, ranks)
+    return selected[ranks[0]], selected[ranks[1]]
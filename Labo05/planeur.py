@@ -1,9 +1,24 @@
 import vtk
+from vtk.util import numpy_support
 import numpy as np
+import os
 import sys
-from datetime import datetime
-import pyproj
-from math import pi, floor, ceil, sqrt
+import time
+import multiprocessing
+from quadmap import QuadMapper
+from gpstrack import readTrack
+from kinematics import verticalSpeed, percentileRange
+from texturemask import prepareTexture
+from isolines import IsolineEngine
+from pyramid import TerrainPyramid, METADATA_FILE
+from trackmesh import buildTrackPolyData, splitFlights
+from simplify import simplifyTrack
+from replay import FlightReplay
+from projection import transform, ProjectionGrid, SWEDISH_CRS, GLOBAL_CRS
+from geoterrain import (POLAR_RADIUS, geoToCartesian, localOrigin, openDem, buildTerrainGrid,
+                        gridSurface, altitudeLookupTable, verticalSpeedLookupTable, buildScalarBar,
+                        placeCamera, offscreenWindow, renderToFile)
+from pipelinecache import PipelineCache
 
 '''
 Dans notre résultat, la carte et le glider ont une différence d'angle de 90°. Cela
@@ -15,54 +30,133 @@ De plus, la carte et le glider étaient écrasés sur une des dimensions (peut-
 pour obtenir une carte plus agréable à regarder.
 '''
 
+# mesure du temps entre un mouvement de souris et la mise à jour de l'isoligne
+class LatencyCounter:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def __str__(self):
+        mean = self.total / self.count if self.count else 0.0
+        return "{} survols, latence moyenne {:.1f}ms, max {:.1f}ms".format(
+            self.count, mean * 1000, self.max * 1000)
+
+
 class MyInteractorStyle(vtk.vtkInteractorStyleTrackballCamera):
 
-    def __init__(self, textActor, renWin, grid, cutter, parent=None):
+    def __init__(self, textActor, renWin, grid, isolines, surface, latencyCounter=None, parent=None):
         self.renWin = renWin
         self.textActor = textActor
         self.grid = grid
         self.AddObserver("MouseMoveEvent",self.mouseMoveEvent)
-        self.cutter = cutter
- 
+        self.isolines = isolines
+        self.latencyCounter = latencyCounter
+
+        # un seul picker, accéléré par un localisateur construit une fois sur le terrain
+        self.locator = vtk.vtkStaticCellLocator()
+        self.locator.SetDataSet(surface)
+        self.locator.BuildLocator()
+        self.picker = vtk.vtkCellPicker()
+        self.picker.AddLocator(self.locator)
+
+        # dernière position de souris pas encore traitée
+        self.pendingPosition = None
+        self.timerObserver = None
+
+    # les mouvements sont regroupés : un seul pick par image au plus
     def mouseMoveEvent(self,obj,event):
-        clickPos = self.GetInteractor().GetEventPosition()
-        picker = vtk.vtkPointPicker()
-        picker.Pick(clickPos[0], clickPos[1], 0, self.GetDefaultRenderer())
-        point = picker.GetPointId()
-        if(point != -1):
-            altitude = self.grid.GetPointData().GetScalars().GetValue(point)
-            self.textActor.SetInput("Altitude : " + str(altitude) + "m")
-            altitudeSphere = vtk.vtkSphere()
-            altitudeSphere.SetRadius(EARTH_RADIUS + altitude)
-            self.cutter.SetCutFunction(altitudeSphere)
-            self.renWin.Render()
+        interactor = self.GetInteractor()
+        if self.timerObserver is None:
+            self.timerObserver = interactor.AddObserver("TimerEvent", self.timerEvent)
+        if self.pendingPosition is None:
+            interactor.CreateOneShotTimer(HOVER_INTERVAL)
+        self.pendingPosition = (interactor.GetEventPosition(), time.perf_counter())
         self.OnMouseMove()
         return
 
+    def timerEvent(self,obj,event):
+        if self.pendingPosition is None:
+            return
+        (x, y), eventTime = self.pendingPosition
+        self.pendingPosition = None
+
+        if self.picker.Pick(x, y, 0, self.GetDefaultRenderer()):
+            point = self.picker.GetPointId()
+            if(point != -1):
+                altitude = self.grid.GetPointData().GetScalars().GetValue(point)
+                self.textActor.SetInput("Altitude : " + str(altitude) + "m")
+                self.isolines.show(altitude)
+                self.renWin.Render()
+
+        if self.latencyCounter is not None:
+            self.latencyCounter.add(time.perf_counter() - eventTime)
+
 # distance de la caméra en proportion du rayon de la terre
 distanceFactor = 1.006
 
 # adapte la carte pour un meilleur rendu
 LON_ADAPT = 0.5
 
-EARTH_RADIUS = 6356750 #6371009
+EARTH_RADIUS = POLAR_RADIUS # geoterrain.EARTH_RADIUS
 
 # chemin des fichiers à traiter
 GLIDER_FILE_PATH = "vtkgps.txt"
 MAP_FILE_PATH = "EarthEnv-DEM90_N60E010.bil"
 TEXTURE_FILE_PATH = "glider_map.jpg"
 
-# taille de la carte initiale
-MAP_SIZE_X = 6000
-MAP_SIZE_Y = 6000
-MAP_SIZE_Z = 1
+# polygone (en pixels) à rendre transparent dans la texture, None pour aucun
+TEXTURE_NODATA_POLYGON = None
 
-# convertisseur de coordonées selon la norme Suédoise vers la globale (longitude lattitude)
-coordinateSwedish = pyproj.Proj(init='epsg:3021')
-coordinateGlobal = pyproj.Proj(init='epsg:4326')
+# dossier des données précalculées
+CACHE_DIR = "cache"
+
+# intervalle minimal (ms) entre deux mises à jour au survol, environ une image
+HOVER_INTERVAL = 16
+
+# affiche la latence du survol à la fermeture de la fenêtre
+REPORT_HOVER_LATENCY = False
 
+# pas (en mètres) entre deux isolignes précalculées
+ISOLINE_STEP = 1
+
+# taille maximale (octets) du cache des terrains transformés
+MESH_CACHE_SIZE = 512 * 1024 * 1024
+
+# pyramide du terrain construite avec pyramid.py, affichée autour de la carte si présente
+TERRAIN_PYRAMID_DIR = os.path.join(CACHE_DIR, "pyramid")
+
+# écart en secondes entre deux positions au-delà duquel un nouveau vol commence
+FLIGHT_GAP = 600
+
+# écart maximal (mètres) de la trace simplifiée à la trace GPS, None pour tout garder
+TRACK_TOLERANCE = 10
+
+# tuiles de la carte, on peut y ajouter les tuiles voisines (ex: N60E015)
+MAP_FILE_PATHS = [MAP_FILE_PATH]
+
+# utilise une grille de projection interpolée pour le terrain (erreur ~1e-7°)
+PROJECTION_GRID = False
+
+# rejeu animé du vol à la place de la trace complète (voir replay.py pour le clavier)
+REPLAY = False
+
+# vitesse initiale du rejeu (secondes de vol par seconde réelle)
+REPLAY_SPEED = 10.0
+
+# taille des images du rendu en lot (python planeur.py --batch ...)
+BATCH_IMAGE_SIZE = (1200, 900)
+
+# convertisseur de coordonées selon la norme Suédoise vers la globale (longitude lattitude)
+# x et y peuvent être des tableaux, le transformeur est partagé entre les appels
 def sweToGlo(x, y):
-    return pyproj.transform(coordinateSwedish, coordinateGlobal, x, y)
+    return transform(SWEDISH_CRS, GLOBAL_CRS, x, y)
 
 
 # coordonées des 4 coins (HG = Haut Gauche, BD = Bas Droite)
@@ -78,320 +172,321 @@ MAX_LONG_SWE, MAX_LAT_SWE = max(xHD, xBD), min(yBD, yBG)
 MIN_LONG, MIN_LAT = sweToGlo(MIN_LONG_SWE, MIN_LAT_SWE)
 MAX_LONG, MAX_LAT = sweToGlo(MAX_LONG_SWE, MAX_LAT_SWE)
 
-# Limites en coordonnées x, y, entre 0 et 6000
-MIN_X = floor((MIN_LONG - 10) * MAP_SIZE_X/5)
-MAX_X = ceil((MAX_LONG - 10) * MAP_SIZE_X/5)
-MIN_Y = floor((MIN_LAT - 65) * MAP_SIZE_Y/-5)
-MAX_Y = ceil((MAX_LAT - 65) * MAP_SIZE_Y/-5)
+# carte projetée en mémoire, seule la fenêtre utilisée est lue
+dem = openDem(MAP_FILE_PATHS)
+
+# Limites en coordonnées x, y dans la carte (MIN_LAT est ici la limite nord)
+MIN_X, MAX_X, MIN_Y, MAX_Y = dem.windowIndices(MIN_LONG, MAX_LONG, MAX_LAT, MIN_LAT)
 
 # moyenne des longitudes et lattitudes pour la caméra
 MEAN_LONG = np.mean([MIN_LONG, MAX_LONG])
 MEAN_LAT = np.mean([MIN_LAT, MAX_LAT])
 
+# origine locale des maillages, les points sont stockés en float32 relativement à elle
+TERRAIN_ORIGIN = localOrigin(MEAN_LAT, MEAN_LONG, EARTH_RADIUS, LON_ADAPT)
+
 # nombre de points du sous-ensemble
 MAP_REDUCED_SIZE_Y = MAX_Y - MIN_Y
 MAP_REDUCED_SIZE_X = MAX_X - MIN_X
 
-# transforme un angle en degrés vers des radians
-def angleToRad(angle):
-    return angle * pi / 180
-
 # méthode de conversion reprise et adaptée en python et au problème
 # https://www.particleincell.com/2012/quad-interpolation/
-# converts physical (x,y) to logical (l,m)
-def XtoL(x, y):
-
-    # create our polygon
-    px = [xHG, xHD, xBD, xBG]
-    py = [yBD, yBG, yHG, yHD]
-
-    # compute coefficients
-    A = [[1, 0, 0, 0], [1, 1, 0, 0], [1, 1, 1, 1], [1, 0, 1, 0]]
-    AI = np.linalg.inv(A)
-    a = np.dot(AI, px)
-    b = np.dot(AI, py)
+# les coefficients du polygone sont calculés une seule fois
+quadMapper = QuadMapper([xHG, xHD, xBD, xBG], [yBD, yBG, yHG, yHD])
 
-    # quadratic equation coeffs, aa*mm^2+bb*m+cc=0
-    aa = a[3]*b[2] - a[2]*b[3]
-    bb = a[3]*b[0] - a[0]*b[3] + a[1]*b[2] - a[2]*b[1] + x*b[3] - y*a[3]
-    cc = a[1]*b[0] - a[0]*b[1] + x*b[1] - y*a[1]
+# partie opaque de la carte en (longitude, latitude) : les 4 coins (l, m) de la
+# texture, le reste de la grille est transparent
+MAP_FOOTPRINT = np.stack(sweToGlo(*quadMapper.forward([0, 1, 1, 0], [0, 0, 1, 1])), axis=-1)
 
-    # compute m = (-b+sqrt(b^2-4ac))/(2a)
-    det = sqrt(bb*bb - 4*aa*cc)
-    m = (-bb+det)/(2*aa)
-
-    # compute l
-    l = (x-a[0]-a[2]*m)/(a[1]+a[3]*m)
+# converts physical (x,y) to logical (l,m), x et y peuvent être des tableaux
+def XtoL(x, y):
+    l, m = quadMapper.inverse(x, y)
     return (l, 1 - m)
 
-# récupèration des données du glider
-gliderCoordinates = np.genfromtxt(GLIDER_FILE_PATH, dtype=[('x', 'i4'), ('y', 'i4'), ('alt', 'f4'), ('date', 'U30')], usecols=(
-    1, 2, 3, 4, 5), skip_header=1, names=('x', 'y', 'altitude', 'date'), encoding='utf-8')
-
-# récupération des données de la carte
-mapData = np.fromfile(MAP_FILE_PATH, dtype=np.int16)
-
-mapData = mapData.reshape(MAP_SIZE_X, MAP_SIZE_Y)
-
-# création de la carte
-structuredGrid = vtk.vtkStructuredGrid()
-structuredGrid.SetDimensions([MAP_REDUCED_SIZE_Y, MAP_REDUCED_SIZE_X, 1])
-
-points = vtk.vtkPoints()
-points.Allocate(MAP_REDUCED_SIZE_Y * MAP_REDUCED_SIZE_X)
-
-# valeurs pour l'application de la texture
-scalars = vtk.vtkFloatArray()
-scalars.SetNumberOfComponents(2)
-
-scalarsAlt = vtk.vtkIntArray()
-scalarsAlt.SetNumberOfComponents(1)
-
-# parcours des données et création des points
-for lon, x in zip(np.linspace(MIN_LONG_SWE, MAX_LONG_SWE, MAP_REDUCED_SIZE_X), range(MIN_X, MAX_X)):
-    for lat, y in zip(np.linspace(MIN_LAT_SWE, MAX_LAT_SWE, MAP_REDUCED_SIZE_Y)[::-1], range(MIN_Y, MAX_Y)):
-        alt = EARTH_RADIUS + mapData[y][x]
-
-        newLon, newLat = sweToGlo(lon, lat)
+# construction complète du terrain transformé, seulement si absent du cache
+def buildTerrainSurface():
+    # récupération des données de la carte
+    mapData = dem.read(MIN_X, MAX_X, MIN_Y, MAX_Y)
 
-        points.InsertNextPoint(
-            alt,
-            angleToRad(newLat),
-            angleToRad(newLon * LON_ADAPT)
-        )
-
-        scalars.InsertNextTuple(XtoL(lon, lat))
-        scalarsAlt.InsertNextValue(mapData[y][x])
-
-structuredGrid.SetPoints(points)
-structuredGrid.GetPointData().SetTCoords(scalars)
-structuredGrid.GetPointData().SetScalars(scalarsAlt)
-
-geometryFilter = vtk.vtkStructuredGridGeometryFilter()
-geometryFilter.SetInputData(structuredGrid)
-
-# création des gliders
-pointsGlider = vtk.vtkPoints()
-pointsGlider.Allocate(len(gliderCoordinates))
-
-speedArray = vtk.vtkFloatArray()
-speedArray.SetNumberOfComponents(1)
-
-# parcours des données pour générer les points avec vitesse verticale
-first = True
-previousDate = 0
-previousAlt = 0
-previousLon = 0
-previousLat = 0
-cpt = 0
-for lon, lat, alt, date in gliderCoordinates:
-    alt = EARTH_RADIUS + alt
-    newLon, newLat = sweToGlo(lon, lat)
-    newDate = datetime.strptime(date, '%m/%y/%d_%H:%M:%S')
-
-    pointsGlider.InsertNextPoint(
-        alt,
-        angleToRad(newLat),
-        angleToRad(newLon * LON_ADAPT)
+    # projection de la grille, exacte ou interpolée
+    if PROJECTION_GRID:
+        terrainProjection = ProjectionGrid(SWEDISH_CRS, GLOBAL_CRS,
+                                           (MIN_LONG_SWE, MAX_LONG_SWE),
+                                           (MIN_LAT_SWE, MAX_LAT_SWE)).transform
+    else:
+        terrainProjection = sweToGlo
+
+    # création de la carte en une seule passe vectorisée
+    structuredGrid = buildTerrainGrid(
+        mapData,
+        (MIN_LONG_SWE, MAX_LONG_SWE), (MIN_LAT_SWE, MAX_LAT_SWE),
+        (0, MAP_REDUCED_SIZE_X), (0, MAP_REDUCED_SIZE_Y),
+        terrainProjection, XtoL, EARTH_RADIUS, LON_ADAPT, TERRAIN_ORIGIN
     )
 
-    if not first:
-        time = (newDate - previousDate).total_seconds()
-        speedArray.InsertNextValue(
-            (alt - previousAlt)/time
-        )
-    else:
-        speedArray.InsertNextValue(1)
-        origin = [alt, angleToRad(newLat), angleToRad(newLon)]
-
-    previousDate = newDate
-    previousAlt = alt
-    previousLon = lon
-    previousLat = lat
-    first = False
-    cpt = cpt + 1
-
-# polyline finale
-polyLine = vtk.vtkPolyLine()
-polyLine.GetPointIds().SetNumberOfIds(len(gliderCoordinates))
-for i in range(len(gliderCoordinates)):
-    polyLine.GetPointIds().SetId(i, i)
-
-cells = vtk.vtkCellArray()
-cells.InsertNextCell(polyLine)
-
-# Création d'un polydata pour y ajouter la polyline, les points et les vitesses
-polyData = vtk.vtkPolyData()
-polyData.SetPoints(pointsGlider)
-polyData.GetPointData().SetScalars(speedArray)
-polyData.SetLines(cells)
-
-# transformation d'altitude lattitude longitude en coordonnées x, y, z
-tf = vtk.vtkSphericalTransform()
-transformFilter = vtk.vtkTransformPolyDataFilter()
-transformFilter.SetTransform(tf)
-transformFilter.SetInputData(polyData)
-transformFilter.Update()
-
-# obtention des points pour en prendre un sous ensemble
-# de manière à éviter les valeurs atypiques dans la
-# lookuptable
-array = []
-for i in range(len(gliderCoordinates)):
-    array.append(speedArray.GetValue(i))
-
-array.sort()
-minRange = array[floor(len(gliderCoordinates) * 0.1)]
-maxRange = array[floor(len(gliderCoordinates) * 0.9)]
-
-# table des couleurs
-lookupColor = vtk.vtkLookupTable()
-lookupColor.SetRange(minRange, maxRange)
-lookupColor.SetNumberOfTableValues(4)
-lookupColor.SetTableValue(0, [0.0, 0.0, 1.0, 1.0])
-lookupColor.SetTableValue(1, [0.0, 0.7, 1.0, 1.0])
-lookupColor.SetTableValue(2, [1.0, 0.7, 0.0, 1.0])
-lookupColor.SetTableValue(3, [1.0, 0.0, 0.0, 1.0])
-lookupColor.SetNanColor(0, 0, 0, 1)
-lookupColor.Build()
-
-# filtre pour afficher un tube au lieu de la polyline
-tubeFilter = vtk.vtkTubeFilter()
-tubeFilter.SetInputConnection(transformFilter.GetOutputPort())
-tubeFilter.SetRadius(40)
-
-# Mapper du polyline
-polylineMapper = vtk.vtkPolyDataMapper()
-polylineMapper.SetInputConnection(tubeFilter.GetOutputPort())
-polylineMapper.ScalarVisibilityOn()
-polylineMapper.SetLookupTable(lookupColor)
-polylineMapper.SetScalarRange(minRange, maxRange)
-polylineMapper.SetColorModeToMapScalars()
-
-polylineActor = vtk.vtkActor()
-polylineActor.SetMapper(polylineMapper)
-polylineActor.PickableOff()
-
-'''application d'une transformation convertissant les altitudes latitudes et longitudes
-en coordonnées sur les axes orthogonaux'''
-
-transformFilter2 = vtk.vtkTransformPolyDataFilter()
-transformFilter2.SetTransform(tf)
-transformFilter2.SetInputConnection(geometryFilter.GetOutputPort())
-transformFilter2.Update()
-
-altitudeSphere = vtk.vtkSphere()
-altitudeSphere.SetRadius(EARTH_RADIUS + 800.0)
-
-cutter = vtk.vtkCutter()
-cutter.SetInputConnection(transformFilter2.GetOutputPort())
-cutter.SetCutFunction(altitudeSphere)
-cutter.Update()
-
-tubeFilter = vtk.vtkTubeFilter()
-tubeFilter.SetInputConnection(cutter.GetOutputPort())
-tubeFilter.SetRadius(20)
-
-traceMapper = vtk.vtkPolyDataMapper()
-traceMapper.SetInputConnection(tubeFilter.GetOutputPort())
-traceMapper.ScalarVisibilityOff()
+    # les points sont déjà cartésiens, plus besoin de vtkSphericalTransform
+    return gridSurface(structuredGrid)
+
+# terrain transformé relu depuis le cache s'il a déjà été construit avec ces paramètres
+meshCache = PipelineCache(os.path.join(CACHE_DIR, "mesh"), MESH_CACHE_SIZE)
+terrainKey = meshCache.key(
+    dem=[meshCache.fileDigest(path) for path in MAP_FILE_PATHS],
+    window=[MIN_X, MAX_X, MIN_Y, MAX_Y],
+    bounds=[MIN_LONG_SWE, MAX_LONG_SWE, MIN_LAT_SWE, MAX_LAT_SWE],
+    corners=[xHG, yHG, xHD, yHD, xBG, yBG, xBD, yBD],
+    projectionGrid=PROJECTION_GRID,
+    origin=TERRAIN_ORIGIN.tolist(),
+    lonAdapt=LON_ADAPT,
+    earthRadius=EARTH_RADIUS
+)
+terrainSurface = meshCache.cached(terrainKey, buildTerrainSurface)
+
+# récupèration des données d'un glider : positions relatives à l'origine des maillages,
+# vitesses verticales et début de chaque vol
+def loadGlider(path):
+    track = readTrack(path)
+
+    # projection de toutes les positions du glider en un seul appel
+    lon, lat = sweToGlo(track.x, track.y)
+    points = geoToCartesian(lat, lon, track.altitude, EARTH_RADIUS, LON_ADAPT, TERRAIN_ORIGIN)
+
+    # vitesse verticale calculée sur toute la trace
+    speeds = verticalSpeed(track.altitude, track.time).astype(np.float32)
+    offsets = splitFlights(track.time, FLIGHT_GAP)
+    return track, points, speeds, offsets
+
+# positions redondantes retirées avant le tube et le rejeu, extremums de vitesse
+# verticale gardés ; la table des couleurs est construite avant, sur toute la trace
+def simplifyGlider(track, points, speeds, offsets):
+    if TRACK_TOLERANCE is None:
+        return track, points, speeds, offsets
+    kept, offsets = simplifyTrack(points, TRACK_TOLERANCE, offsets, speeds)
+    track = track._make(column[kept] for column in track)
+    return track, points[kept], speeds[kept], offsets
+
+# table des couleurs des vitesses verticales
+def buildLookupColor(speeds):
+    # bornes de la lookuptable aux 10e et 90e centiles
+    # de manière à éviter les valeurs atypiques
+    minRange, maxRange = percentileRange(speeds, 0.1, 0.9)
+    return verticalSpeedLookupTable(minRange, maxRange)
+
+# acteur de la trace : une polyline par vol affichée en tube
+def buildTrackActor(points, speeds, offsets, lookupColor):
+    # Création d'un polydata avec une polyline par vol, les points et les vitesses
+    polyData = buildTrackPolyData(points, speeds, offsets)
+
+    # filtre pour afficher un tube au lieu de la polyline
+    tubeFilter = vtk.vtkTubeFilter()
+    tubeFilter.SetInputData(polyData)
+    tubeFilter.SetRadius(40)
+
+    # Mapper du polyline
+    polylineMapper = vtk.vtkPolyDataMapper()
+    polylineMapper.SetInputConnection(tubeFilter.GetOutputPort())
+    polylineMapper.ScalarVisibilityOn()
+    polylineMapper.SetLookupTable(lookupColor)
+    polylineMapper.SetScalarRange(lookupColor.GetRange())
+    polylineMapper.SetColorModeToMapScalars()
+
+    polylineActor = vtk.vtkActor()
+    polylineActor.SetMapper(polylineMapper)
+    polylineActor.SetPosition(TERRAIN_ORIGIN)
+    polylineActor.PickableOff()
+    return polylineActor
 
 mapMapper = vtk.vtkPolyDataMapper()
-mapMapper.SetInputConnection(transformFilter2.GetOutputPort())
+mapMapper.SetInputData(terrainSurface)
 mapMapper.ScalarVisibilityOff()
 
-# mapping des points pour la texture
-mappedPoints = vtk.vtkJPEGReader()
-mappedPoints.SetFileName(TEXTURE_FILE_PATH)
-mappedPoints.Update()
-imageData = mappedPoints.GetOutput()
-imageX, imageY, imageZ = imageData.GetDimensions()
-
-# masque transparent 
-transparentMask = vtk.vtkImageData()
-transparentMask.SetExtent(imageData.GetExtent())
-transparentMask.AllocateScalars(vtk.VTK_UNSIGNED_CHAR, 1)
-
-for x in range(imageX):
-    for y in range(imageY):
-        if x == 0 or y == 0 or x == imageX - 1 or y == imageY - 1:
-            transparentMask.SetScalarComponentFromFloat(x, y, 0, 0, 0)
-        else:
-            transparentMask.SetScalarComponentFromFloat(x, y, 0, 0, 255)
-
-appendComponent = vtk.vtkImageAppendComponents()
-appendComponent.AddInputConnection(mappedPoints.GetOutputPort())
-appendComponent.AddInputData(transparentMask)
+# texture RGBA avec bordure transparente, préparée en NumPy et mise en cache
+textureImage = prepareTexture(TEXTURE_FILE_PATH, TEXTURE_NODATA_POLYGON, CACHE_DIR)
 
 # création de la texture
 texture = vtk.vtkTexture()
-texture.SetInputConnection(appendComponent.GetOutputPort())
+texture.SetInputData(textureImage)
 texture.InterpolateOn()
 texture.RepeatOff()
 
 mapActor = vtk.vtkActor()
 mapActor.SetMapper(mapMapper)
+mapActor.SetPosition(TERRAIN_ORIGIN)
 mapActor.SetTexture(texture)
 
-traceActor = vtk.vtkActor()
-traceActor.SetMapper(traceMapper)
-traceActor.GetProperty().SetColor(1,0,0)
-
-# légende pour la lookupTable
-scalarBar = vtk.vtkScalarBarActor()
-scalarBar.SetLookupTable(lookupColor)
-scalarBar.SetTitle("Vertical Speed")
-scalarBar.SetLabelFormat("%4.0f")
-scalarBar.SetVerticalTitleSeparation(30)
-
-# 2dactor for displaying text
-textActor = vtk.vtkTextActor()
-textActor.SetTextScaleModeToNone()
-textActor.SetDisplayPosition(10, 10)
-textActor.SetInput("")
-
-tprop = textActor.GetTextProperty()
-tprop.SetFontSize(20)
-tprop.SetFontFamilyToArial()
-tprop.SetJustificationToLeft()
-tprop.BoldOn()
-tprop.SetColor(1, 0, 0)
-
-ren1 = vtk.vtkRenderer()
-ren1.AddActor(mapActor)
-ren1.AddActor(traceActor)
-ren1.AddActor(polylineActor)
-ren1.AddActor(scalarBar)
-ren1.AddActor(textActor)
-ren1.SetBackground(0.1, 0.2, 0.4)
-ren1.SetUseFXAA(True)
-
-renWin = vtk.vtkRenderWindow()
-renWin.AddRenderer(ren1)
-renWin.SetSize(800, 600)
-
-renWin.Render()
+# couleurs du terrain multi-résolution : altitudes de la carte détaillée
+terrainLookupTable = altitudeLookupTable(*terrainSurface.GetPointData().GetScalars().GetRange())
+
+# renderer avec la carte et le terrain multi-résolution autour si présent
+def buildRenderer():
+    renderer = vtk.vtkRenderer()
+    renderer.AddActor(mapActor)
+    renderer.SetBackground(0.1, 0.2, 0.4)
+    renderer.SetUseFXAA(True)
+
+    # terrain multi-résolution autour de la carte, tuiles choisies selon la caméra,
+    # sans ses cellules sous la carte
+    if os.path.isfile(os.path.join(TERRAIN_PYRAMID_DIR, METADATA_FILE)):
+        terrainPyramid = TerrainPyramid(TERRAIN_PYRAMID_DIR, EARTH_RADIUS, LON_ADAPT,
+                                        lookupTable=terrainLookupTable, origin=TERRAIN_ORIGIN, footprint=MAP_FOOTPRINT)
+        terrainPyramid.attach(renderer)
+    return renderer
 
 # caméra posée au dessus du centre de la carte
-cameraPosIn = [distanceFactor * EARTH_RADIUS,
-               angleToRad(MEAN_LAT), angleToRad(MEAN_LONG * LON_ADAPT)]
-cameraPosOut = [0, 0, 0]
-tf.TransformPoint(cameraPosIn, cameraPosOut)
-
-camera = vtk.vtkCamera()
-camera.SetPosition(cameraPosOut)
-camera.SetFocalPoint(mapActor.GetCenter())
-camera.Roll(-90)
-ren1.SetActiveCamera(camera)
-ren1.ResetCameraClippingRange()
-
-renWin.Render()
-
-iren = vtk.vtkRenderWindowInteractor()
-iren.SetRenderWindow(renWin)
-style = MyInteractorStyle(textActor, renWin, structuredGrid, cutter)
-style.SetDefaultRenderer(ren1)
-iren.SetInteractorStyle(style)
-
-iren.Initialize()
-iren.Start()
+def placeMapCamera(renderer):
+    placeCamera(renderer, MEAN_LAT, MEAN_LONG, EARTH_RADIUS, distanceFactor,
+                mapActor.GetCenter(), LON_ADAPT)
+
+
+# rendu en lot : chaque processus construit une fois sa fenêtre hors écran et sa scène,
+# seule la trace (et sa légende) est remplacée d'un vol à l'autre
+batchScene = {}
+
+def initBatchWorker():
+    renderer = buildRenderer()
+    scalarBar = buildScalarBar(None, "Vertical Speed")
+    renderer.AddActor(scalarBar)
+
+    # rendering offscreen car non nécessaire
+    renWin = offscreenWindow(renderer, BATCH_IMAGE_SIZE)
+    placeMapCamera(renderer)
+
+    batchScene["renderer"] = renderer
+    batchScene["renWin"] = renWin
+    batchScene["scalarBar"] = scalarBar
+    batchScene["trackActor"] = None
+
+# rend une trace, renvoie (trace, image, None) ou (trace, None, message) : un fichier
+# illisible ou mal formé ne doit pas arrêter le lot
+def renderFlight(paths):
+    gpsPath, pngPath = paths
+    renderer = batchScene["renderer"]
+
+    try:
+        track, points, speeds, offsets = loadGlider(gpsPath)
+    except (ValueError, OSError) as error:
+        return gpsPath, None, str(error)
+    if len(points) == 0:
+        return gpsPath, None, "no position"
+
+    lookupColor = buildLookupColor(speeds)
+    track, points, speeds, offsets = simplifyGlider(track, points, speeds, offsets)
+    trackActor = buildTrackActor(points, speeds, offsets, lookupColor)
+    if batchScene["trackActor"] is not None:
+        renderer.RemoveActor(batchScene["trackActor"])
+    renderer.AddActor(trackActor)
+    batchScene["trackActor"] = trackActor
+    batchScene["scalarBar"].SetLookupTable(lookupColor)
+
+    renderer.ResetCameraClippingRange()
+    renderToFile(batchScene["renWin"], pngPath)
+    return gpsPath, pngPath, None
+
+# rend chaque trace GPS du dossier en PNG, réparties sur workers processus
+def renderFlights(gpsDir, outputDir, workers=None):
+    os.makedirs(outputDir, exist_ok=True)
+    jobs = [(os.path.join(gpsDir, name), os.path.join(outputDir, os.path.splitext(name)[0] + ".png"))
+            for name in sorted(os.listdir(gpsDir))
+            if not name.startswith(".") and os.path.isfile(os.path.join(gpsDir, name))]
+
+    def report(results):
+        for gpsPath, pngPath, error in results:
+            print(gpsPath + (" -> " + pngPath if pngPath else " : " + error))
+
+    if workers == 1:
+        initBatchWorker()
+        report(map(renderFlight, jobs))
+    else:
+        # le pool est fermé même si le rendu d'une trace échoue
+        with multiprocessing.Pool(workers, initBatchWorker) as pool:
+            report(pool.imap_unordered(renderFlight, jobs))
+
+
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == "--batch":
+    if len(sys.argv) < 4:
+        print("Usage : python planeur.py --batch <gps directory> <output directory> [workers]")
+        sys.exit()
+    start = time.perf_counter()
+    renderFlights(sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else None)
+    print("done in {:.1f}s".format(time.perf_counter() - start))
+
+elif __name__ == "__main__":
+    gliderTrack, pointsGlider, verticalSpeeds, flightOffsets = loadGlider(GLIDER_FILE_PATH)
+    lookupColor = buildLookupColor(verticalSpeeds)
+    gliderTrack, pointsGlider, verticalSpeeds, flightOffsets = simplifyGlider(
+        gliderTrack, pointsGlider, verticalSpeeds, flightOffsets)
+    polylineActor = buildTrackActor(pointsGlider, verticalSpeeds, flightOffsets, lookupColor)
+
+    # isolignes précalculées dans l'espace de la grille, sur les points transformés
+    isolines = IsolineEngine(
+        numpy_support.vtk_to_numpy(terrainSurface.GetPointData().GetScalars())
+        .reshape(MAP_REDUCED_SIZE_X, MAP_REDUCED_SIZE_Y),
+        numpy_support.vtk_to_numpy(terrainSurface.GetPoints().GetData())
+        .reshape(MAP_REDUCED_SIZE_X, MAP_REDUCED_SIZE_Y, 3),
+        ISOLINE_STEP
+    )
+    isolines.show(800)
+    isolines.startPrecompute()
+
+    # les lignes sont affichées comme des tubes sans passer par un vtkTubeFilter
+    traceMapper = vtk.vtkPolyDataMapper()
+    traceMapper.SetInputData(isolines.output)
+    traceMapper.ScalarVisibilityOff()
+
+    traceActor = vtk.vtkActor()
+    traceActor.SetMapper(traceMapper)
+    traceActor.SetPosition(TERRAIN_ORIGIN)
+    traceActor.GetProperty().SetColor(1,0,0)
+    traceActor.GetProperty().RenderLinesAsTubesOn()
+    traceActor.GetProperty().SetLineWidth(4)
+
+    # 2dactor for displaying text
+    textActor = vtk.vtkTextActor()
+    textActor.SetTextScaleModeToNone()
+    textActor.SetDisplayPosition(10, 10)
+    textActor.SetInput("")
+
+    tprop = textActor.GetTextProperty()
+    tprop.SetFontSize(20)
+    tprop.SetFontFamilyToArial()
+    tprop.SetJustificationToLeft()
+    tprop.BoldOn()
+    tprop.SetColor(1, 0, 0)
+
+    ren1 = buildRenderer()
+    ren1.AddActor(traceActor)
+    if not REPLAY:
+        ren1.AddActor(polylineActor)
+    ren1.AddActor(buildScalarBar(lookupColor, "Vertical Speed"))
+    ren1.AddActor(textActor)
+
+    renWin = vtk.vtkRenderWindow()
+    renWin.AddRenderer(ren1)
+    renWin.SetSize(800, 600)
+
+    renWin.Render()
+
+    placeMapCamera(ren1)
+
+    renWin.Render()
+
+    iren = vtk.vtkRenderWindowInteractor()
+    iren.SetRenderWindow(renWin)
+    latencyCounter = LatencyCounter() if REPORT_HOVER_LATENCY else None
+    style = MyInteractorStyle(textActor, renWin, terrainSurface, isolines,
+                              terrainSurface, latencyCounter)
+    style.SetDefaultRenderer(ren1)
+    iren.SetInteractorStyle(style)
+
+    # la traînée et le marqueur avancent avec le timer, sans reconstruire la trace
+    if REPLAY:
+        replay = FlightReplay(pointsGlider, gliderTrack.time, verticalSpeeds, flightOffsets,
+                              TERRAIN_ORIGIN, REPLAY_SPEED, lookupColor)
+        replay.attach(ren1, iren)
+
+    iren.Initialize()
+    iren.Start()
+
+    isolines.stopPrecompute()
+
+    if latencyCounter is not None:
+        print(latencyCounter)
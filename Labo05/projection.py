@@ -0,0 +1,91 @@
+import numpy as np
+from functools import lru_cache
+from pyproj import Transformer
+
+'''
+Service de projection partagé.
+
+Un seul pyproj.Transformer est construit par couple (source, cible) et réutilisé
+pour tous les appels, qui transforment des tableaux entiers d'un coup.
+ProjectionGrid précalcule la projection sur une grille grossière et l'interpole
+bilinéairement : l'erreur est faible et connue, le gain est important pour les
+grilles de terrain denses.
+'''
+
+# normes utilisées par le planeur : suédoise (RT90) et globale (longitude, latitude)
+SWEDISH_CRS = 'epsg:3021'
+GLOBAL_CRS = 'epsg:4326'
+
+
+# transformeur en cache ; always_xy garde l'ordre (x, y) / (lon, lat) de pyproj.transform
+@lru_cache(maxsize=None)
+def getTransformer(source, target):
+    return Transformer.from_crs(source, target, always_xy=True)
+
+
+# transforme des coordonnées (scalaires ou tableaux) de source vers target
+def transform(source, target, x, y):
+    return getTransformer(source, target).transform(x, y)
+
+
+class ProjectionGrid:
+
+    # précalcule la projection sur une grille de shape nœuds couvrant les limites
+    def __init__(self, source, target, xRange, yRange, shape=(65, 65)):
+        self.source = source
+        self.target = target
+        self.xMin, self.xMax = min(xRange), max(xRange)
+        self.yMin, self.yMax = min(yRange), max(yRange)
+        self.nx, self.ny = shape
+
+        xs = np.linspace(self.xMin, self.xMax, self.nx)
+        ys = np.linspace(self.yMin, self.yMax, self.ny)
+        xGrid, yGrid = np.meshgrid(xs, ys, indexing='ij')
+        self.u, self.v = transform(source, target, xGrid, yGrid)
+
+        # erreur maximale mesurée au centre des cellules, le pire cas de l'interpolation
+        cx = (xs[:-1] + xs[1:]) / 2
+        cy = (ys[:-1] + ys[1:]) / 2
+        cxGrid, cyGrid = np.meshgrid(cx, cy, indexing='ij')
+        exactU, exactV = transform(source, target, cxGrid, cyGrid)
+        approxU, approxV = self.transform(cxGrid, cyGrid)
+        self.maxError = max(np.abs(exactU - approxU).max(), np.abs(exactV - approxV).max())
+
+    # interpolation bilinéaire de la projection, hors limites la valeur est extrapolée
+    def transform(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        fx = (x - self.xMin) / (self.xMax - self.xMin) * (self.nx - 1)
+        fy = (y - self.yMin) / (self.yMax - self.yMin) * (self.ny - 1)
+        ix = np.clip(np.floor(fx).astype(np.intp), 0, self.nx - 2)
+        iy = np.clip(np.floor(fy).astype(np.intp), 0, self.ny - 2)
+        tx = fx - ix
+        ty = fy - iy
+
+        def interpolate(grid):
+            return ((grid[ix, iy] * (1 - tx) + grid[ix + 1, iy] * tx) * (1 - ty) +
+                    (grid[ix, iy + 1] * (1 - tx) + grid[ix + 1, iy + 1] * tx) * ty)
+
+        return interpolate(self.u), interpolate(self.v)
+
+
+# compare la projection exacte et la grille interpolée sur une grille de terrain
+if __name__ == "__main__":
+    import time
+
+    xRange, yRange = (1349340, 1371835), (7005969, 7022967)
+    xs, ys = np.meshgrid(np.linspace(*xRange, 1000), np.linspace(*yRange, 1000))
+
+    start = time.perf_counter()
+    exact = transform(SWEDISH_CRS, GLOBAL_CRS, xs, ys)
+    exactTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    grid = ProjectionGrid(SWEDISH_CRS, GLOBAL_CRS, xRange, yRange)
+    approx = grid.transform(xs, ys)
+    gridTime = time.perf_counter() - start
+
+    error = max(np.abs(exact[0] - approx[0]).max(), np.abs(exact[1] - approx[1]).max())
+    print("10^6 points : exact {:.3f}s, grille {:.3f}s, erreur {:.2e}° (estimée {:.2e}°)".format(
+        exactTime, gridTime, error, grid.maxError))
@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import vtk
+import numpy as np
+from math import pi, ceil, log2
+from collections import OrderedDict
+from vtk.util import numpy_support
+from geoterrain import openDem, geoToCartesian
+
+'''
+Pyramide multi-résolution du terrain.
+
+La construction (hors ligne) réduit la carte par puissances de 2 et découpe chaque
+niveau en tuiles carrées enregistrées en .npy, avec un fichier pyramid.json qui
+décrit la géométrie. À l'affichage, les tuiles sont choisies selon la distance à
+la caméra (quadtree) : les tuiles proches sont détaillées, les lointaines
+grossières, ce qui garde un nombre de points à peu près constant quel que soit le
+zoom. Les points sont stockés en float32 relativement à l'origine locale des
+autres maillages.
+
+La carte détaillée n'est pas échantillonnée sur la même grille que la pyramide
+(projection suédoise d'un côté, longitude / latitude du MNT de l'autre) : les deux
+surfaces diffèrent de plusieurs mètres et un décalage de profondeur ne suffit pas à
+garder la carte devant. Les cellules entièrement sous l'emprise de la carte ne sont
+donc pas affichées, et les points sous l'emprise sont enfoncés de UNDERLAY_DEPTH
+pour que les cellules du bord passent sous la carte.
+
+Construction : python pyramid.py <dossier de sortie> <tuile.bil> [<tuile.bil> ...]
+'''
+
+# nombre de cellules par côté d'une tuile
+TILE_SIZE = 256
+
+# une tuile est subdivisée si la caméra est plus proche que LOD_FACTOR fois sa taille
+LOD_FACTOR = 1.0
+
+# nombre maximal de tuiles gardées prêtes à l'affichage, dépassé seulement si plus sont affichées
+ACTOR_CACHE_SIZE = 256
+
+# profondeur (mètres) des points de la pyramide recouverts par la carte détaillée
+UNDERLAY_DEPTH = 50
+
+METADATA_FILE = "pyramid.json"
+
+
+def tilePath(directory, level, row, col):
+    return os.path.join(directory, "level{}".format(level), "{}_{}.npy".format(row, col))
+
+
+# nombre de tuiles (lignes, colonnes) d'un niveau
+def tileCounts(nrows, ncols, level, tileSize):
+    factor = 2 ** level
+    rows = (nrows - 1) // factor + 1
+    cols = (ncols - 1) // factor + 1
+    return max(1, ceil((rows - 1) / tileSize)), max(1, ceil((cols - 1) / tileSize))
+
+
+# points (longitudes, latitudes) à l'intérieur du polygone convexe [(lon, lat), ...]
+def insidePolygon(lons, lats, polygon):
+    polygon = np.asarray(polygon, dtype=np.float64)
+    positive = np.ones(np.shape(lons), dtype=bool)
+    negative = np.ones(np.shape(lons), dtype=bool)
+    for (x0, y0), (x1, y1) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        cross = (x1 - x0) * (lats - y0) - (y1 - y0) * (lons - x0)
+        positive &= cross >= 0
+        negative &= cross <= 0
+    return positive | negative
+
+
+# construit la pyramide d'une ou plusieurs tuiles .bil dans directory
+def buildPyramid(paths, directory, tileSize=TILE_SIZE):
+    dem = openDem(paths)
+    nrows, ncols = dem.nrows, dem.ncols
+    levels = max(1, ceil(log2(max(nrows, ncols) / tileSize)) + 1)
+
+    for level in range(levels):
+        factor = 2 ** level
+        tileRows, tileCols = tileCounts(nrows, ncols, level, tileSize)
+        os.makedirs(os.path.join(directory, "level{}".format(level)), exist_ok=True)
+
+        for row in range(tileRows):
+            for col in range(tileCols):
+                # une ligne / colonne de recouvrement pour éviter les fentes entre tuiles,
+                # réduction par échantillonnage de la fenêtre (vue sur la carte en mémoire)
+                minY = row * tileSize * factor
+                minX = col * tileSize * factor
+                maxY = min(((row + 1) * tileSize) * factor + 1, nrows)
+                maxX = min(((col + 1) * tileSize) * factor + 1, ncols)
+                tile = dem.read(minX, maxX, minY, maxY)[::factor, ::factor]
+                np.save(tilePath(directory, level, row, col),
+                        np.ascontiguousarray(tile, dtype=np.int16))
+        print("level {} : {}x{} tiles".format(level, tileRows, tileCols))
+
+    metadata = {
+        "lonMin": dem.lonMin, "latMax": dem.latMax,
+        "lonRes": dem.lonSpan / dem.ncols, "latRes": dem.latSpan / dem.nrows,
+        "nrows": nrows, "ncols": ncols,
+        "tileSize": tileSize, "levels": levels,
+    }
+    with open(os.path.join(directory, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+class TerrainPyramid:
+
+    # origin : origine locale des maillages (float64), footprint : emprise (lon, lat)
+    # de la carte détaillée affichée avec la pyramide, polygone convexe
+    def __init__(self, directory, earthRadius, lonAdapt=1.0,
+                 lookupTable=None, lodFactor=LOD_FACTOR, origin=None, footprint=None):
+        self.directory = directory
+        with open(os.path.join(directory, METADATA_FILE)) as f:
+            self.metadata = json.load(f)
+        self.earthRadius = earthRadius
+        self.lonAdapt = lonAdapt
+        self.lookupTable = lookupTable
+        self.lodFactor = lodFactor
+        self.origin = origin
+        self.footprint = footprint
+
+        self.actors = OrderedDict()
+        self.visible = set()
+        self.renderer = None
+
+    # coordonnées géographiques (degrés) de la cellule (i, j) du niveau
+    def geographic(self, level, row, col):
+        meta = self.metadata
+        factor = 2 ** level
+        lon = meta["lonMin"] + col * factor * meta["lonRes"]
+        lat = meta["latMax"] - row * factor * meta["latRes"]
+        return lon, lat
+
+    def toCartesian(self, altitude, lat, lon):
+        return geoToCartesian(lat, lon, altitude, self.earthRadius, self.lonAdapt, dtype=np.float64)
+
+    # taille approximative d'une tuile du niveau, en mètres
+    def tileExtent(self, level):
+        meta = self.metadata
+        return meta["tileSize"] * 2 ** level * meta["latRes"] * pi / 180 * self.earthRadius
+
+    # tuiles (niveau, ligne, colonne) à afficher pour la position de la caméra
+    def selectTiles(self, cameraPosition):
+        meta = self.metadata
+        top = meta["levels"] - 1
+        rows, cols = tileCounts(meta["nrows"], meta["ncols"], top, meta["tileSize"])
+        camera = np.array(cameraPosition)
+        selected = []
+
+        def visit(level, row, col):
+            tileRows, tileCols = tileCounts(meta["nrows"], meta["ncols"], level, meta["tileSize"])
+            if row >= tileRows or col >= tileCols:
+                return
+            half = meta["tileSize"] / 2
+            lon, lat = self.geographic(level, row * meta["tileSize"] + half, col * meta["tileSize"] + half)
+            distance = np.linalg.norm(camera - self.toCartesian(0, lat, lon))
+            if level == 0 or distance > self.lodFactor * self.tileExtent(level):
+                selected.append((level, row, col))
+            else:
+                for childRow in (2 * row, 2 * row + 1):
+                    for childCol in (2 * col, 2 * col + 1):
+                        visit(level - 1, childRow, childCol)
+
+        for row in range(rows):
+            for col in range(cols):
+                visit(top, row, col)
+        return selected
+
+    # acteur d'une tuile, construit à la première demande puis gardé en cache
+    def tileActor(self, key):
+        if key in self.actors:
+            self.actors.move_to_end(key)
+            return self.actors[key]
+
+        level, row, col = key
+        altitudes = np.load(tilePath(self.directory, *key))
+        tileRows, tileCols = altitudes.shape
+        size = self.metadata["tileSize"]
+
+        lon0, lat0 = self.geographic(level, row * size, col * size)
+        lon1, lat1 = self.geographic(level, row * size + tileRows - 1, col * size + tileCols - 1)
+        lats, lons = np.meshgrid(np.linspace(lat0, lat1, tileRows),
+                                 np.linspace(lon0, lon1, tileCols), indexing='ij')
+
+        # points sous la carte détaillée enfoncés, cellules entièrement dessous cachées
+        if self.footprint is not None:
+            covered = insidePolygon(lons, lats, self.footprint)
+        else:
+            covered = np.zeros(altitudes.shape, dtype=bool)
+        depths = np.where(covered, UNDERLAY_DEPTH, 0)
+        hidden = covered[:-1, :-1] & covered[1:, :-1] & covered[:-1, 1:] & covered[1:, 1:]
+
+        points = geoToCartesian(lats.ravel(), lons.ravel(),
+                                altitudes.ravel().astype(np.float64) - depths.ravel(),
+                                self.earthRadius, self.lonAdapt, self.origin)
+
+        grid = vtk.vtkStructuredGrid()
+        grid.SetDimensions(tileCols, tileRows, 1)
+        vtkPoints = vtk.vtkPoints()
+        vtkPoints.SetData(numpy_support.numpy_to_vtk(points, deep=True))
+        grid.SetPoints(vtkPoints)
+        grid.GetPointData().SetScalars(
+            numpy_support.numpy_to_vtk(altitudes.ravel().astype(np.int32), deep=True))
+
+        geometryFilter = vtk.vtkStructuredGridGeometryFilter()
+        if hidden.any():
+            ghosts = numpy_support.numpy_to_vtk(
+                np.where(hidden, vtk.vtkDataSetAttributes.HIDDENCELL, 0).astype(np.uint8).ravel(),
+                deep=True, array_type=vtk.VTK_UNSIGNED_CHAR)
+            ghosts.SetName(vtk.vtkDataSetAttributes.GhostArrayName())
+            grid.GetCellData().AddArray(ghosts)
+            # contrairement à vtkStructuredGridGeometryFilter, retire les cellules cachées
+            geometryFilter = vtk.vtkGeometryFilter()
+        geometryFilter.SetInputData(grid)
+        geometryFilter.Update()
+
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputData(geometryFilter.GetOutput())
+        if self.lookupTable is not None:
+            mapper.SetLookupTable(self.lookupTable)
+            mapper.UseLookupTableScalarRangeOn()
+        else:
+            mapper.ScalarVisibilityOff()
+
+        actor = vtk.vtkActor()
+        actor.SetMapper(mapper)
+        if self.origin is not None:
+            actor.SetPosition(self.origin)
+        actor.PickableOff()
+
+        self.actors[key] = actor
+        return actor
+
+    # met à jour les tuiles affichées selon la caméra du renderer
+    def update(self, obj=None, event=None):
+        wanted = set(self.selectTiles(self.renderer.GetActiveCamera().GetPosition()))
+        for key in self.visible - wanted:
+            self.renderer.RemoveActor(self.actors[key])
+        for key in wanted - self.visible:
+            self.renderer.AddActor(self.tileActor(key))
+        self.visible = wanted
+
+        # cache réduit aux tuiles les plus récentes, celles affichées ne sont jamais retirées
+        stale = [key for key in self.actors if key not in wanted]
+        for key in stale[:max(0, len(self.actors) - ACTOR_CACHE_SIZE)]:
+            del self.actors[key]
+
+    # les tuiles sont réévaluées avant chaque rendu
+    def attach(self, renderer):
+        self.renderer = renderer
+        renderer.AddObserver("StartEvent", self.update)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage : python pyramid.py <output directory> <tile.bil> [<tile.bil> ...]")
+        sys.exit()
+    buildPyramid(sys.argv[2:], sys.argv[1])
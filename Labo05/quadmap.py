@@ -0,0 +1,118 @@
+import numpy as np
+
+'''
+Interpolation bilinéaire d'un quadrilatère quelconque.
+
+Méthode reprise de https://www.particleincell.com/2012/quad-interpolation/
+Les coefficients ne dépendent que des 4 coins, ils sont donc calculés une seule
+fois à la création. Les méthodes acceptent aussi bien des scalaires que des tableaux.
+'''
+
+# en dessous de cette valeur, le terme quadratique est considéré comme nul
+DEGENERATE_EPSILON = 1e-12
+
+# matrice inverse du système pour les coins (0,0), (1,0), (1,1), (0,1)
+QUAD_MATRIX_INV = np.linalg.inv([[1, 0, 0, 0], [1, 1, 0, 0], [1, 1, 1, 1], [1, 0, 1, 0]])
+
+
+class QuadMapper:
+
+    def __init__(self, px, py):
+        self.a = np.dot(QUAD_MATRIX_INV, px)
+        self.b = np.dot(QUAD_MATRIX_INV, py)
+        a, b = self.a, self.b
+
+        # parties constantes des coefficients de aa*m^2 + bb*m + cc = 0
+        self.aa = a[3]*b[2] - a[2]*b[3]
+        self.bb0 = a[3]*b[0] - a[0]*b[3] + a[1]*b[2] - a[2]*b[1]
+        self.cc0 = a[1]*b[0] - a[0]*b[1]
+
+        # normalise le seuil par l'échelle du quadrilatère
+        scale = max(np.abs(a[1:]).max(), np.abs(b[1:]).max(), 1.0)
+        self.degenerate = abs(self.aa) < DEGENERATE_EPSILON * scale * scale
+
+    # converts logical (l,m) to physical (x,y)
+    def forward(self, l, m):
+        a, b = self.a, self.b
+        l = np.asarray(l, dtype=np.float64)
+        m = np.asarray(m, dtype=np.float64)
+        x = a[0] + a[1]*l + a[2]*m + a[3]*l*m
+        y = b[0] + b[1]*l + b[2]*m + b[3]*l*m
+        return x, y
+
+    # converts physical (x,y) to logical (l,m)
+    def inverse(self, x, y):
+        a, b = self.a, self.b
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        bb = self.bb0 + x*b[3] - y*a[3]
+        cc = self.cc0 + x*b[1] - y*a[1]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.degenerate:
+                # quadrilatère de type parallélogramme : l'équation devient linéaire
+                m = -cc / bb
+            else:
+                det = np.sqrt(bb*bb - 4*self.aa*cc)
+                m = (-bb + det) / (2*self.aa)
+
+            # l depuis l'équation en x, ou en y si son dénominateur s'annule
+            denomX = a[1] + a[3]*m
+            denomY = b[1] + b[3]*m
+            useX = np.abs(denomX) >= np.abs(denomY)
+            l = np.where(useX,
+                         (x - a[0] - a[2]*m) / np.where(useX, denomX, 1.0),
+                         (y - b[0] - b[2]*m) / np.where(useX, 1.0, denomY))
+
+        return l, m
+
+
+# compare la version vectorisée avec l'ancienne fonction scalaire sur 10^6 points
+if __name__ == "__main__":
+    import sys
+    import time
+    from math import sqrt
+
+    xHG, yHG = 1349340, 7022573
+    xHD, yHD = 1371573, 7022967
+    xBG, yBG = 1349602, 7005969
+    xBD, yBD = 1371835, 7006362
+    px = [xHG, xHD, xBD, xBG]
+    py = [yBD, yBG, yHG, yHD]
+
+    def XtoL(x, y):
+        A = [[1, 0, 0, 0], [1, 1, 0, 0], [1, 1, 1, 1], [1, 0, 1, 0]]
+        AI = np.linalg.inv(A)
+        a = np.dot(AI, px)
+        b = np.dot(AI, py)
+        aa = a[3]*b[2] - a[2]*b[3]
+        bb = a[3]*b[0] - a[0]*b[3] + a[1]*b[2] - a[2]*b[1] + x*b[3] - y*a[3]
+        cc = a[1]*b[0] - a[0]*b[1] + x*b[1] - y*a[1]
+        det = sqrt(bb*bb - 4*aa*cc)
+        m = (-bb+det)/(2*aa)
+        l = (x-a[0]-a[2]*m)/(a[1]+a[3]*m)
+        return (l, m)
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    rng = np.random.RandomState(0)
+    quad = QuadMapper(px, py)
+    xs, ys = quad.forward(rng.rand(n), rng.rand(n))
+
+    start = time.perf_counter()
+    l, m = quad.inverse(xs, ys)
+    vectorTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scalar = [XtoL(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+    scalarTime = time.perf_counter() - start
+
+    scalar = np.array(scalar)
+    error = max(np.abs(l - scalar[:, 0]).max(), np.abs(m - scalar[:, 1]).max())
+    print("{} points : QuadMapper {:.3f}s, XtoL {:.3f}s (x{:.0f}), écart max {:.2e}".format(
+        n, vectorTime, scalarTime, scalarTime / vectorTime, error))
+
+    # un parallélogramme donne aa = 0, l'inversion doit rester finie
+    square = QuadMapper([0, 10, 10, 0], [0, 0, 10, 10])
+    l, m = square.inverse([0, 5, 10], [0, 5, 10])
+    assert square.degenerate and np.allclose(l, [0, 0.5, 1]) and np.allclose(m, [0, 0.5, 1])
@@ -0,0 +1,238 @@
+import time
+import vtk
+import numpy as np
+from vtk.util import numpy_support
+from trackmesh import ID_TYPE
+
+'''
+Rejeu animé d'un vol.
+
+Une horloge de rejeu avance sur les temps de la trace à chaque événement du
+timer : le marqueur est placé par interpolation entre les deux positions qui
+encadrent l'instant courant et la traînée montre les segments déjà parcourus.
+Tous les segments sont construits une seule fois ; à chaque image, seul le
+nombre de cellules visibles change (vues sur les tableaux offsets / connectivity),
+les points, les couleurs et le polydata ne sont jamais reconstruits. La traînée
+est affichée en RenderLinesAsTubes, sans vtkTubeFilter à réexécuter.
+
+Clavier : espace pause, flèches gauche / droite recul / avance, flèches haut / bas
+vitesse x2 / ÷2, Home retour au début.
+'''
+
+# intervalle (ms) du timer, environ 60 images par seconde
+DEFAULT_INTERVAL = 16
+
+# vitesse de rejeu par défaut (secondes de vol par seconde réelle)
+DEFAULT_SPEED = 10.0
+
+# saut des flèches gauche / droite, en secondes réelles à la vitesse courante
+SEEK_STEP = 5.0
+
+
+class FlightReplay:
+
+    # points (N, 3) relatifs à origin, temps croissants (N), scalaires optionnels
+    # (N) et offsets des vols (voir splitFlights) : aucun segment entre deux vols
+    def __init__(self, points, times, scalars=None, offsets=None, origin=(0, 0, 0),
+                 speed=DEFAULT_SPEED, lookupTable=None, markerRadius=80):
+        self.points = np.ascontiguousarray(points)
+        self.times = np.asarray(times, dtype=np.float64)
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.speed = speed
+        self.paused = False
+        self.current = self.times[0]
+        self.lastTick = None
+        self.interactor = None
+        self.renderWindow = None
+        self.timerId = None
+
+        count = len(self.points)
+        if offsets is None:
+            offsets = [0, count]
+        self.flightStarts = np.asarray(offsets[:-1], dtype=np.int64)
+
+        # segments (i, i + 1) dans l'ordre du temps, sauf entre deux vols
+        starts = np.arange(count - 1)
+        starts = starts[~np.isin(starts + 1, self.flightStarts)]
+        self.connectivity = np.stack((starts, starts + 1), axis=1).ravel().astype(ID_TYPE)
+        self.offsets = np.arange(0, len(self.connectivity) + 1, 2, dtype=ID_TYPE)
+        self.segmentEnds = self.times[starts + 1]
+        self.visibleCount = None
+
+        vtkPoints = vtk.vtkPoints()
+        vtkPoints.SetData(numpy_support.numpy_to_vtk(self.points, deep=False))
+        self.lines = vtk.vtkCellArray()
+        self.trail = vtk.vtkPolyData()
+        self.trail.SetPoints(vtkPoints)
+        self.trail.SetLines(self.lines)
+        if scalars is not None:
+            self.scalars = np.ascontiguousarray(scalars)
+            self.trail.GetPointData().SetScalars(numpy_support.numpy_to_vtk(self.scalars, deep=False))
+
+        trailMapper = vtk.vtkPolyDataMapper()
+        trailMapper.SetInputData(self.trail)
+        if lookupTable is not None and scalars is not None:
+            trailMapper.SetLookupTable(lookupTable)
+            trailMapper.UseLookupTableScalarRangeOn()
+        else:
+            trailMapper.ScalarVisibilityOff()
+
+        self.trailActor = vtk.vtkActor()
+        self.trailActor.SetMapper(trailMapper)
+        self.trailActor.SetPosition(self.origin)
+        self.trailActor.GetProperty().RenderLinesAsTubesOn()
+        self.trailActor.GetProperty().SetLineWidth(5)
+        self.trailActor.PickableOff()
+
+        marker = vtk.vtkSphereSource()
+        marker.SetRadius(markerRadius)
+        markerMapper = vtk.vtkPolyDataMapper()
+        markerMapper.SetInputConnection(marker.GetOutputPort())
+        self.markerActor = vtk.vtkActor()
+        self.markerActor.SetMapper(markerMapper)
+        self.markerActor.GetProperty().SetColor(1, 1, 1)
+        self.markerActor.PickableOff()
+
+        self.textActor = vtk.vtkTextActor()
+        self.textActor.SetDisplayPosition(10, 40)
+        self.textActor.GetTextProperty().SetFontSize(18)
+        self.textActor.GetTextProperty().SetColor(1, 1, 1)
+
+        self.setTime(self.current)
+
+    # place l'horloge de rejeu à l'instant t (secondes epoch)
+    def setTime(self, t):
+        times = self.times
+        t = min(max(t, times[0]), times[-1])
+
+        # dans un trou entre deux vols, on saute directement au vol suivant
+        index = int(np.searchsorted(times, t, side='right')) - 1
+        index = min(index, len(times) - 2) if len(times) > 1 else 0
+        if index + 1 in self.flightStarts and t > times[index]:
+            index += 1
+            t = times[index]
+        self.current = t
+
+        visibleCount = int(np.searchsorted(self.segmentEnds, t, side='right'))
+        if visibleCount != self.visibleCount:
+            self.visibleCount = visibleCount
+            # vues sur les tableaux construits une fois, sans copie
+            self.lines.SetData(
+                numpy_support.numpy_to_vtkIdTypeArray(self.offsets[:visibleCount + 1], deep=False),
+                numpy_support.numpy_to_vtkIdTypeArray(self.connectivity[:2 * visibleCount], deep=False))
+            self.trail.Modified()
+
+        position = self.points[index].astype(np.float64)
+        if index + 1 < len(times) and times[index + 1] > times[index]:
+            fraction = (t - times[index]) / (times[index + 1] - times[index])
+            position += fraction * (self.points[index + 1] - self.points[index])
+        self.markerActor.SetPosition(self.origin + position)
+
+        self.textActor.SetInput("{}  x{:g}{}".format(
+            time.strftime("%d/%m/%y %H:%M:%S", time.gmtime(t)), self.speed,
+            "  (pause)" if self.paused else ""))
+
+    def addTo(self, renderer):
+        renderer.AddActor(self.trailActor)
+        renderer.AddActor(self.markerActor)
+        renderer.AddActor(self.textActor)
+
+    # démarre le timer de l'interacteur et écoute le clavier
+    def attach(self, renderer, interactor, interval=DEFAULT_INTERVAL):
+        self.addTo(renderer)
+        self.interactor = interactor
+        self.renderWindow = interactor.GetRenderWindow()
+        interactor.AddObserver("TimerEvent", self.tick)
+        interactor.AddObserver("KeyPressEvent", self.keyPress)
+        self.timerId = interactor.CreateRepeatingTimer(interval)
+
+    def tick(self, obj, event):
+        # d'autres timers (survol) partagent l'événement
+        if obj.GetTimerEventId() != self.timerId:
+            return
+        now = time.perf_counter()
+        if self.paused:
+            self.lastTick = None
+            return
+        if self.lastTick is not None:
+            self.setTime(self.current + (now - self.lastTick) * self.speed)
+            if self.current >= self.times[-1]:
+                self.paused = True
+                self.setTime(self.current)
+        self.lastTick = now
+        self.renderWindow.Render()
+
+    def keyPress(self, obj, event):
+        key = obj.GetKeySym()
+        if key == "space":
+            self.paused = not self.paused
+            # relancé depuis la fin : on reprend au début
+            if not self.paused and self.current >= self.times[-1]:
+                self.current = self.times[0]
+        elif key == "Right":
+            self.setTime(self.current + SEEK_STEP * self.speed)
+        elif key == "Left":
+            self.setTime(self.current - SEEK_STEP * self.speed)
+        elif key == "Up":
+            self.speed *= 2
+        elif key == "Down":
+            self.speed /= 2
+        elif key == "Home":
+            self.setTime(self.times[0])
+        else:
+            return
+        self.setTime(self.current)
+        self.renderWindow.Render()
+
+
+# coût par image du rejeu sur une trace synthétique de 100k positions (hors écran) :
+# mise à jour incrémentale seule, avec le rendu, et reconstruction tube filter pour comparer
+if __name__ == "__main__":
+    from trackmesh import buildTrackPolyData
+
+    count = 100000
+    angle = np.linspace(0, 40 * np.pi, count)
+    points = np.stack((5000 * np.cos(angle), 5000 * np.sin(angle),
+                       np.linspace(0, 3000, count)), axis=1).astype(np.float32)
+    times = 1000000000 + np.arange(count, dtype=np.int64)
+
+    lookupTable = vtk.vtkLookupTable()
+    lookupTable.SetRange(0, 3000)
+    lookupTable.Build()
+    replay = FlightReplay(points, times, points[:, 2].copy(), lookupTable=lookupTable)
+
+    renderer = vtk.vtkRenderer()
+    replay.addTo(renderer)
+    renderWindow = vtk.vtkRenderWindow()
+    renderWindow.OffScreenRenderingOn()
+    renderWindow.AddRenderer(renderer)
+    renderWindow.SetSize(800, 600)
+    renderer.ResetCamera()
+    renderWindow.Render()
+
+    frames = 300
+    frameTimes = times[0] + np.linspace(1, count - 1, frames)
+
+    start = time.perf_counter()
+    for t in frameTimes:
+        replay.setTime(t)
+    update = (time.perf_counter() - start) / frames
+
+    start = time.perf_counter()
+    for t in frameTimes:
+        replay.setTime(t)
+        renderWindow.Render()
+    total = (time.perf_counter() - start) / frames
+
+    # ancienne méthode : polydata et tube filter reconstruits à chaque image
+    start = time.perf_counter()
+    for t in frameTimes[::30]:
+        tubeFilter = vtk.vtkTubeFilter()
+        tubeFilter.SetInputData(buildTrackPolyData(points[:int(t - times[0]) + 1]))
+        tubeFilter.SetRadius(40)
+        tubeFilter.Update()
+    rebuild = (time.perf_counter() - start) / len(frameTimes[::30])
+
+    print("mise à jour incrémentale : {:.3f}ms par image".format(update * 1000))
+    print("mise à jour + rendu : {:.1f}ms par image ({:.0f} images/s)".format(total * 1000, 1 / total))
+    print("reconstruction tube filter : {:.1f}ms par image".format(rebuild * 1000))
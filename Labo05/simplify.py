@@ -0,0 +1,176 @@
+import numpy as np
+from math import tan, radians
+
+'''
+Simplification des traces GPS avant la construction du polydata.
+
+Une trace à 1 Hz contient surtout des points alignés qui ne changent rien à
+l'image mais coûtent autant que les autres dans le vtkTubeFilter. On applique
+Douglas-Peucker en 3D (écart en mètres au segment simplifié) vol par vol, en
+gardant toujours le début et la fin de chaque vol ainsi que les extremums locaux
+de vitesse verticale, qui donnent les couleurs de la trace. La tolérance peut
+être donnée en pixels à l'écran avec screenTolerance.
+'''
+
+# taille (en positions) de la fenêtre dans laquelle un extremum de vitesse est gardé
+DEFAULT_EXTREMA_WINDOW = 31
+
+
+# tolérance en mètres correspondant à un écart de pixels à l'écran, pour une caméra
+# de vue verticale viewAngle (degrés) à la distance donnée
+def screenTolerance(pixels, distance, viewAngle=30.0, height=600):
+    return pixels * 2 * distance * tan(radians(viewAngle) / 2) / height
+
+
+# indices des maximums et minimums de values dans une fenêtre centrée de window positions
+def speedExtremes(values, window=DEFAULT_EXTREMA_WINDOW):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0 or window < 3:
+        return np.empty(0, dtype=np.int64)
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return np.empty(0, dtype=np.int64)
+    values = np.where(valid, values, np.median(values[valid]))
+
+    half = window // 2
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(values, half, mode='edge'), 2 * half + 1)
+    # premier indice du maximum seulement, un plateau ne garde pas tous ses points
+    extremes = (windows.argmax(axis=1) == half) | (windows.argmin(axis=1) == half)
+    return np.flatnonzero(extremes)
+
+
+# masque des points gardés par Douglas-Peucker entre chaque paire d'indices
+# consécutifs de anchors (toujours gardés)
+def douglasPeucker(points, tolerance, anchors):
+    points = np.asarray(points, dtype=np.float64)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[anchors] = True
+    tolerance2 = tolerance * tolerance
+
+    stack = list(zip(anchors[:-1], anchors[1:]))
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        segment = points[last] - points[first]
+        inner = points[first + 1:last] - points[first]
+        length2 = segment @ segment
+        if length2 > 0:
+            t = np.clip(inner @ segment / length2, 0, 1)
+            inner = inner - t[:, np.newaxis] * segment
+        distances2 = np.einsum('ij,ij->i', inner, inner)
+
+        farthest = int(distances2.argmax())
+        if distances2[farthest] > tolerance2:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return keep
+
+
+# indices des positions gardées et offsets des vols (voir splitFlights) recalculés
+# pour la trace simplifiée
+def simplifyTrack(points, tolerance, offsets=None, speeds=None, window=DEFAULT_EXTREMA_WINDOW):
+    count = len(points)
+    if offsets is None:
+        offsets = np.array([0, count], dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if count == 0:
+        return np.empty(0, dtype=np.int64), offsets
+
+    anchors = [offsets[:-1], offsets[1:] - 1]
+    if speeds is not None:
+        anchors.append(speedExtremes(speeds, window))
+    anchors = np.unique(np.concatenate(anchors))
+
+    indices = np.flatnonzero(douglasPeucker(points, tolerance, anchors))
+    return indices, np.searchsorted(indices, offsets)
+
+
+# points, mémoire du tube et temps de rendu avant et après simplification, sur une
+# trace donnée en argument (coordonnées suédoises en mètres) ou un long vol synthétique
+if __name__ == "__main__":
+    import sys
+    import time
+    import vtk
+    from gpstrack import readTrack
+    from kinematics import verticalSpeed
+    from trackmesh import buildTrackPolyData, splitFlights
+
+    tolerance = 10.0
+    if len(sys.argv) > 1:
+        track = readTrack(sys.argv[1])
+        points = np.stack((track.x, track.y, track.altitude), axis=1).astype(np.float64)
+        times = track.time
+    else:
+        # 14h de vol à 1 Hz : spirales en thermique et transitions bruitées
+        rng = np.random.RandomState(0)
+        count = 50000
+        times = np.arange(count, dtype=np.int64)
+        phase = times % 600
+        climbing = phase < 300
+        angle = np.cumsum(np.where(climbing, 0.25, rng.normal(0, 0.01, count)))
+        speed = np.where(climbing, 20.0, 30.0)
+        x = np.cumsum(speed * np.cos(angle))
+        y = np.cumsum(speed * np.sin(angle))
+        altitude = 1000 + np.cumsum(np.where(climbing, 2.0, -1.5) + rng.normal(0, 0.3, count))
+        points = np.stack((x, y, altitude), axis=1) + rng.normal(0, 1.0, (count, 3))
+
+    speeds = verticalSpeed(points[:, 2], times).astype(np.float32)
+    offsets = splitFlights(times)
+
+    start = time.perf_counter()
+    indices, simplifiedOffsets = simplifyTrack(points, tolerance, offsets, speeds)
+    simplifyTime = time.perf_counter() - start
+
+    # chaque position supprimée reste à moins de la tolérance du segment qui la remplace
+    removed = np.setdiff1d(np.arange(len(points)), indices)
+    following = np.searchsorted(indices, removed)
+    first, last = points[indices[following - 1]], points[indices[following]]
+    segment = last - first
+    t = np.clip(np.einsum('ij,ij->i', points[removed] - first, segment) /
+                np.einsum('ij,ij->i', segment, segment), 0, 1)
+    deviation = np.linalg.norm(points[removed] - first - t[:, np.newaxis] * segment, axis=1)
+    assert indices[0] == 0 and indices[-1] == len(points) - 1
+    assert deviation.max() <= tolerance
+
+    def measure(trackPoints, trackSpeeds, trackOffsets):
+        origin = trackPoints.mean(axis=0)
+        polyData = buildTrackPolyData((trackPoints - origin).astype(np.float32),
+                                      trackSpeeds, trackOffsets)
+        tubeFilter = vtk.vtkTubeFilter()
+        tubeFilter.SetInputData(polyData)
+        tubeFilter.SetRadius(40)
+        tubeFilter.Update()
+
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputConnection(tubeFilter.GetOutputPort())
+        actor = vtk.vtkActor()
+        actor.SetMapper(mapper)
+        renderer = vtk.vtkRenderer()
+        renderer.AddActor(actor)
+        renderWindow = vtk.vtkRenderWindow()
+        renderWindow.OffScreenRenderingOn()
+        renderWindow.AddRenderer(renderer)
+        renderWindow.SetSize(800, 600)
+        renderer.ResetCamera()
+        renderWindow.Render()
+
+        frames = 20
+        start = time.perf_counter()
+        for frame in range(frames):
+            renderer.GetActiveCamera().Azimuth(1)
+            renderWindow.Render()
+        renderTime = (time.perf_counter() - start) / frames
+        return tubeFilter.GetOutput().GetNumberOfPoints(), \
+            tubeFilter.GetOutput().GetActualMemorySize(), renderTime
+
+    before = measure(points, speeds, offsets)
+    after = measure(points[indices], speeds[indices], simplifiedOffsets)
+
+    print("tolérance {}m, simplification {:.3f}s".format(tolerance, simplifyTime))
+    for name, count, (tubePoints, memory, renderTime) in (("avant", len(points), before),
+                                                          ("après", len(indices), after)):
+        print("{} : {} positions, tube {} points {} Kio, rendu {:.1f}ms".format(
+            name, count, tubePoints, memory, renderTime * 1000))
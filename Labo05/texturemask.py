@@ -0,0 +1,102 @@
+import os
+import hashlib
+import vtk
+import numpy as np
+from vtk.util import numpy_support
+
+'''
+Préparation de la texture RGBA de la carte.
+
+Le canal alpha est construit en NumPy : la bordure d'un pixel est transparente et
+un polygone optionnel (zone sans données) peut être rendu transparent lui aussi.
+L'image est ensuite attachée à une vtkImageData sans copie. Le résultat est mis en
+cache sur le disque, identifié par l'empreinte de l'image source et du polygone.
+'''
+
+
+# canal alpha : 255 partout, 0 sur la bordure et dans le polygone éventuel
+def alphaMask(width, height, polygon=None):
+    alpha = np.full((height, width), 255, dtype=np.uint8)
+    alpha[0, :] = alpha[-1, :] = 0
+    alpha[:, 0] = alpha[:, -1] = 0
+
+    if polygon is not None and len(polygon) >= 3:
+        # test pair-impair vectorisé sur tous les pixels, une arête à la fois
+        ys, xs = np.mgrid[0:height, 0:width]
+        inside = np.zeros((height, width), dtype=bool)
+        px, py = zip(*polygon)
+        for i in range(len(polygon)):
+            x0, y0 = px[i - 1], py[i - 1]
+            x1, y1 = px[i], py[i]
+            if y0 == y1:
+                continue
+            crosses = (y0 > ys) != (y1 > ys)
+            xCross = x0 + (ys - y0) * (x1 - x0) / (y1 - y0)
+            inside ^= crosses & (xs < xCross)
+        alpha[inside] = 0
+
+    return alpha
+
+
+# lit une image (jpg, png...) et la renvoie en tableau (hauteur, largeur, composantes)
+def readImage(path):
+    reader = vtk.vtkImageReader2Factory.CreateImageReader2(path)
+    if reader is None:
+        raise ValueError("Unsupported image format : " + path)
+    reader.SetFileName(path)
+    reader.Update()
+    image = reader.GetOutput()
+    width, height, _ = image.GetDimensions()
+    pixels = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars())
+    return pixels.reshape(height, width, -1)
+
+
+# attache un tableau RGBA (hauteur, largeur, 4) à une vtkImageData sans copie
+def rgbaToImageData(rgba):
+    height, width, _ = rgba.shape
+    imageData = vtk.vtkImageData()
+    imageData.SetDimensions(width, height, 1)
+    scalars = numpy_support.numpy_to_vtk(rgba.reshape(-1, 4), deep=False)
+    scalars.SetName("RGBA")
+    imageData.GetPointData().SetScalars(scalars)
+    return imageData
+
+
+# empreinte de l'image source et des paramètres du masque
+def textureKey(path, polygon=None):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(repr(polygon).encode())
+    return digest.hexdigest()
+
+
+# texture RGBA prête à l'emploi, relue depuis le cache si elle a déjà été préparée
+def prepareTexture(path, polygon=None, cacheDir=None):
+    cachePath = None
+    if cacheDir is not None:
+        cachePath = os.path.join(cacheDir, "texture_" + textureKey(path, polygon) + ".npy")
+        if os.path.isfile(cachePath):
+            # un fichier tronqué ou corrompu est reconstruit et remplacé ci-dessous
+            try:
+                return rgbaToImageData(np.load(cachePath))
+            except (ValueError, OSError, EOFError):
+                pass
+
+    pixels = readImage(path)
+    height, width, components = pixels.shape
+
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[:, :, :3] = pixels[:, :, :3] if components >= 3 else pixels[:, :, :1]
+    rgba[:, :, 3] = alphaMask(width, height, polygon)
+
+    if cachePath is not None:
+        os.makedirs(cacheDir, exist_ok=True)
+        # écriture dans un fichier temporaire propre au processus puis renommage pour
+        # rester atomique, les processus du rendu en lot pouvant préparer la texture ensemble
+        temporaryPath = cachePath + ".{}.tmp.npy".format(os.getpid())
+        np.save(temporaryPath, rgba)
+        os.replace(temporaryPath, cachePath)
+
+    return rgbaToImageData(rgba)
@@ -0,0 +1,53 @@
+import vtk
+import numpy as np
+from vtk.util import numpy_support
+
+'''
+Construction du polydata d'une trace directement depuis des tableaux NumPy.
+
+Les points et la connectivité des lignes (offsets / connectivity du vtkCellArray)
+sont donnés à VTK sans appel Python par point. Une trace peut contenir plusieurs
+vols, séparés par les trous dans le temps, chacun devient une ligne du polydata.
+'''
+
+# écart (en secondes) au-delà duquel on considère qu'un nouveau vol commence
+DEFAULT_FLIGHT_GAP = 600
+
+# type NumPy correspondant à vtkIdType
+ID_TYPE = numpy_support.get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]
+
+
+# indices de début de chaque vol, suivis du nombre total de points
+def splitFlights(time, maxGap=DEFAULT_FLIGHT_GAP):
+    time = np.asarray(time)
+    breaks = np.flatnonzero(np.diff(time) > maxGap) + 1
+    return np.concatenate(([0], breaks, [len(time)])).astype(np.int64)
+
+
+# polydata avec une polyline par vol ; offsets vaut [0, n] par défaut (un seul vol)
+def buildTrackPolyData(points, scalars=None, offsets=None):
+    points = np.ascontiguousarray(points)
+    if offsets is None:
+        offsets = np.array([0, len(points)], dtype=np.int64)
+
+    vtkPoints = vtk.vtkPoints()
+    vtkPoints.SetData(numpy_support.numpy_to_vtk(points, deep=False))
+
+    # les points sont déjà dans l'ordre des lignes : la connectivité est 0..n-1
+    connectivity = np.arange(len(points), dtype=ID_TYPE)
+    offsets = np.asarray(offsets).astype(ID_TYPE)
+
+    lines = vtk.vtkCellArray()
+    lines.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=False),
+                  numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=False))
+
+    polyData = vtk.vtkPolyData()
+    polyData.SetPoints(vtkPoints)
+    polyData.SetLines(lines)
+
+    if scalars is not None:
+        if not isinstance(scalars, vtk.vtkDataArray):
+            scalars = numpy_support.numpy_to_vtk(np.ascontiguousarray(scalars), deep=False)
+        polyData.GetPointData().SetScalars(scalars)
+
+    return polyData
@@ -0,0 +1,22 @@
+'''
+Bibliothèque commune aux vues de terrain (Labo03/map.py, Labo05/planeur.py).
+
+ - geomesh : coordonnées géographiques vers cartésiennes, rayons terrestres ;
+ - demreader : lecture par fenêtre des rasters d'altitude .bil / .hgt ;
+ - terrain : maillages vectorisés depuis un MNT, donnés à VTK sans copie ;
+ - colors : tables de couleurs (altitudes, vitesses verticales) et légendes ;
+ - render : placement de la caméra et rendu dans un fichier ;
+ - imagewriter : écriture PNG en arrière-plan et vidéo.
+
+Installée une fois depuis la racine du dépôt (pip install -e .), elle est ensuite
+importée par les scripts des labos comme n'importe quel paquet.
+'''
+
+from .geomesh import (EARTH_RADIUS, POLAR_RADIUS, angleToRad, sphericalToCartesian,
+                      geoToSpherical, geoToCartesian, localOrigin)
+from .demreader import DemTile, openDem, readRaster
+from .terrain import (regularTerrainPoints, demGrid, gridSurface, terrainCoordinates,
+                      buildTerrainGrid)
+from .colors import altitudeLookupTable, verticalSpeedLookupTable, buildScalarBar
+from .render import placeCamera, offscreenWindow, renderToFile
+from .imagewriter import BackgroundWriter, windowPixels, createVideoWriter
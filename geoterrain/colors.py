@@ -0,0 +1,52 @@
+import vtk
+
+'''
+Tables de couleurs et légendes communes aux vues de terrain.
+'''
+
+
+# altitudes : vert en plaine tirant sur le blanc en passant par le jaune,
+# ce qui est sous la plage (l'eau) en bleu
+def altitudeLookupTable(minAltitude, maxAltitude, discrete=False):
+    colorsArray = vtk.vtkLookupTable()
+    colorsArray.SetRange(minAltitude, maxAltitude)
+    colorsArray.SetValueRange(0.4, 1)
+    colorsArray.SetHueRange(0.3, 0)
+    colorsArray.SetSaturationRange(0.8, 0)
+    colorsArray.SetNanColor(1, 1, 1, 1)
+    colorsArray.SetScaleToLog10()
+    colorsArray.SetBelowRangeColor(0, 0, 1, 1)
+    colorsArray.SetUseBelowRangeColor(True)
+    if discrete:
+        colorsArray.SetNumberOfTableValues(7)
+    colorsArray.Build()
+    return colorsArray
+
+
+# vitesses verticales : bleu en descente, rouge en montée, noir si inconnue
+def verticalSpeedLookupTable(minSpeed, maxSpeed):
+    lookupColor = vtk.vtkLookupTable()
+    lookupColor.SetRange(minSpeed, maxSpeed)
+    lookupColor.SetNumberOfTableValues(4)
+    lookupColor.SetTableValue(0, [0.0, 0.0, 1.0, 1.0])
+    lookupColor.SetTableValue(1, [0.0, 0.7, 1.0, 1.0])
+    lookupColor.SetTableValue(2, [1.0, 0.7, 0.0, 1.0])
+    lookupColor.SetTableValue(3, [1.0, 0.0, 0.0, 1.0])
+    lookupColor.SetNanColor(0, 0, 0, 1)
+    lookupColor.Build()
+    return lookupColor
+
+
+# légende d'une lookup table, avec la case sous la plage si belowRangeAnnotation est donné
+def buildScalarBar(lookupTable, title, numberOfLabels=None, belowRangeAnnotation=None):
+    scalarBar = vtk.vtkScalarBarActor()
+    scalarBar.SetLookupTable(lookupTable)
+    scalarBar.SetTitle(title)
+    scalarBar.SetLabelFormat("%4.0f")
+    scalarBar.SetVerticalTitleSeparation(30)
+    if numberOfLabels is not None:
+        scalarBar.SetNumberOfLabels(numberOfLabels)
+    if belowRangeAnnotation is not None:
+        scalarBar.SetDrawBelowRangeSwatch(True)
+        scalarBar.SetBelowRangeAnnotation(belowRangeAnnotation)
+    return scalarBar
@@ -0,0 +1,185 @@
+import os
+import re
+import numpy as np
+from math import floor, ceil
+
+'''
+Lecture des tuiles d'altitude .bil / .hgt par fenêtre.
+
+Le fichier est ouvert avec np.memmap : seules les pages de la fenêtre demandée
+sont lues depuis le disque, la mémoire et les entrées/sorties dépendent donc de la
+zone affichée et non de la taille de la tuile. Le type des pixels et les
+dimensions viennent du .hdr (NBITS, PIXELTYPE, BYTEORDER, NROWS, NCOLS) ; sans
+en-tête la tuile est carrée, en int16, big-endian pour un .hgt (SRTM). Plusieurs
+tuiles voisines peuvent être réunies en un seul raster logique (DemMosaic) sans
+les charger entièrement.
+'''
+
+# taille par défaut d'une tuile EarthEnv-DEM90 (en degrés)
+DEFAULT_TILE_SPAN = 5
+
+# valeur utilisée hors des tuiles disponibles d'une mosaïque
+DEFAULT_NODATA = -32768
+
+TILE_NAME = re.compile(r'([NS])(\d+)([EW])(\d+)', re.IGNORECASE)
+
+PIXEL_TYPES = {
+    (8, 'UNSIGNEDINT'): np.uint8,
+    (16, 'SIGNEDINT'): np.int16,
+    (16, 'UNSIGNEDINT'): np.uint16,
+    (32, 'SIGNEDINT'): np.int32,
+    (32, 'FLOAT'): np.float32,
+}
+
+
+# lit le fichier .hdr (format ESRI BIL) associé s'il existe
+def readHeader(path):
+    hdrPath = os.path.splitext(path)[0] + '.hdr'
+    header = {}
+    if os.path.isfile(hdrPath):
+        with open(hdrPath) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2:
+                    header[parts[0].upper()] = parts[1]
+    return header
+
+
+# coin sud-ouest déduit du nom de la tuile (ex: N60E010)
+def cornerFromName(path):
+    match = TILE_NAME.search(os.path.basename(path))
+    if match is None:
+        raise ValueError("Cannot deduce tile position from name : " + path)
+    lat = int(match.group(2)) * (1 if match.group(1).upper() == 'N' else -1)
+    lon = int(match.group(4)) * (1 if match.group(3).upper() == 'E' else -1)
+    return lon, lat
+
+
+# raster brut projeté en mémoire (lignes, colonnes), sans sa position géographique
+def readRaster(path, header=None):
+    if header is None:
+        header = readHeader(path)
+
+    nbits = int(header.get('NBITS', 16))
+    pixelType = header.get('PIXELTYPE', 'SIGNEDINT').upper()
+    defaultOrder = 'M' if path.lower().endswith('.hgt') else 'I'
+    byteOrder = '>' if header.get('BYTEORDER', defaultOrder).upper() == 'M' else '<'
+    dtype = np.dtype(PIXEL_TYPES[(nbits, pixelType)]).newbyteorder(byteOrder)
+
+    count = os.path.getsize(path) // dtype.itemsize
+    if 'NROWS' in header:
+        nrows, ncols = int(header['NROWS']), int(header['NCOLS'])
+    else:
+        # tuile carrée sans en-tête
+        nrows = ncols = int(round(np.sqrt(count)))
+    if nrows * ncols != count:
+        raise ValueError("Unexpected raster size : " + path)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(nrows, ncols))
+
+
+class DemTile:
+
+    def __init__(self, path, span=DEFAULT_TILE_SPAN):
+        self.path = path
+        header = readHeader(path)
+
+        self.data = readRaster(path, header)
+        self.dtype = self.data.dtype
+        self.nrows, self.ncols = self.data.shape
+        self.nodata = header.get('NODATA')
+
+        if 'ULXMAP' in header:
+            xdim = float(header['XDIM'])
+            ydim = float(header['YDIM'])
+            # ULXMAP/ULYMAP désignent le centre du premier pixel
+            self.lonMin = float(header['ULXMAP']) - xdim / 2
+            self.latMax = float(header['ULYMAP']) + ydim / 2
+            self.lonSpan = xdim * self.ncols
+            self.latSpan = ydim * self.nrows
+        else:
+            lon, lat = cornerFromName(path)
+            self.lonMin = lon
+            self.latMax = lat + span
+            self.lonSpan = span
+            self.latSpan = span
+
+    @property
+    def lonMax(self):
+        return self.lonMin + self.lonSpan
+
+    @property
+    def latMin(self):
+        return self.latMax - self.latSpan
+
+    # indices (colonnes, lignes) englobant la fenêtre en longitude / latitude
+    def windowIndices(self, minLon, maxLon, minLat, maxLat):
+        minX = floor((minLon - self.lonMin) * self.ncols / self.lonSpan)
+        maxX = ceil((maxLon - self.lonMin) * self.ncols / self.lonSpan)
+        minY = floor((maxLat - self.latMax) * self.nrows / -self.latSpan)
+        maxY = ceil((minLat - self.latMax) * self.nrows / -self.latSpan)
+        return minX, maxX, minY, maxY
+
+    # vue sans copie sur les lignes / colonnes demandées
+    def read(self, minX, maxX, minY, maxY):
+        return self.data[minY:maxY, minX:maxX]
+
+    # fenêtre en longitude / latitude, sans copie
+    def window(self, minLon, maxLon, minLat, maxLat):
+        return self.read(*self.windowIndices(minLon, maxLon, minLat, maxLat))
+
+
+class DemMosaic:
+
+    def __init__(self, paths, span=DEFAULT_TILE_SPAN, nodata=DEFAULT_NODATA):
+        self.tiles = [DemTile(path, span) for path in paths]
+        first = self.tiles[0]
+        self.dtype = first.dtype
+        self.nodata = nodata
+
+        # résolution commune à toutes les tuiles
+        self.lonRes = first.lonSpan / first.ncols
+        self.latRes = first.latSpan / first.nrows
+        for tile in self.tiles:
+            if not (np.isclose(tile.lonSpan / tile.ncols, self.lonRes) and
+                    np.isclose(tile.latSpan / tile.nrows, self.latRes)):
+                raise ValueError("Tiles must share the same resolution : " + tile.path)
+
+        self.lonMin = min(tile.lonMin for tile in self.tiles)
+        self.latMax = max(tile.latMax for tile in self.tiles)
+        self.ncols = int(round((max(tile.lonMax for tile in self.tiles) - self.lonMin) / self.lonRes))
+        self.nrows = int(round((self.latMax - min(tile.latMin for tile in self.tiles)) / self.latRes))
+        self.lonSpan = self.ncols * self.lonRes
+        self.latSpan = self.nrows * self.latRes
+
+        # position (colonne, ligne) de chaque tuile dans le raster logique
+        self.offsets = [(int(round((tile.lonMin - self.lonMin) / self.lonRes)),
+                         int(round((self.latMax - tile.latMax) / self.latRes)))
+                        for tile in self.tiles]
+
+    windowIndices = DemTile.windowIndices
+    window = DemTile.window
+
+    # seule la fenêtre est allouée ; une vue est rendue si une tuile suffit
+    def read(self, minX, maxX, minY, maxY):
+        for tile, (offX, offY) in zip(self.tiles, self.offsets):
+            if (offX <= minX and maxX <= offX + tile.ncols and
+                    offY <= minY and maxY <= offY + tile.nrows):
+                return tile.read(minX - offX, maxX - offX, minY - offY, maxY - offY)
+
+        result = np.full((maxY - minY, maxX - minX), self.nodata, dtype=self.dtype)
+        for tile, (offX, offY) in zip(self.tiles, self.offsets):
+            x0, x1 = max(minX, offX), min(maxX, offX + tile.ncols)
+            y0, y1 = max(minY, offY), min(maxY, offY + tile.nrows)
+            if x0 < x1 and y0 < y1:
+                result[y0 - minY:y1 - minY, x0 - minX:x1 - minX] = \
+                    tile.read(x0 - offX, x1 - offX, y0 - offY, y1 - offY)
+        return result
+
+
+# ouvre une tuile seule ou une mosaïque de tuiles voisines
+def openDem(paths):
+    if isinstance(paths, str):
+        return DemTile(paths)
+    if len(paths) == 1:
+        return DemTile(paths[0])
+    return DemMosaic(paths)
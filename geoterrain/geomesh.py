@@ -0,0 +1,52 @@
+import numpy as np
+from math import pi
+
+'''
+Conversion directe des coordonnées géographiques en coordonnées cartésiennes.
+
+On garde la convention des scripts, (rayon, latitude, longitude) passés tels quels
+à vtkSphericalTransform, pour que les scènes restent identiques : le calcul est
+simplement fait en une passe NumPy au lieu d'un vtkTransformPolyDataFilter qui
+recopie tout le maillage. Avec une origine locale, les points sont stockés en
+float32 relativement à cette origine (précision centimétrique au lieu d'un demi
+mètre à l'échelle du rayon terrestre) et l'acteur est placé à l'origine.
+'''
+
+# rayon moyen de la terre (map.py) et rayon polaire (planeur.py), en mètres
+EARTH_RADIUS = 6371009
+POLAR_RADIUS = 6356750
+
+
+# transforme un angle en degrés vers des radians
+def angleToRad(angle):
+    return angle * pi / 180
+
+
+# même formule que vtkSphericalTransform : phi angle polaire, theta azimut
+def sphericalToCartesian(radius, phi, theta):
+    radius = np.asarray(radius, dtype=np.float64)
+    sinPhi = np.sin(phi)
+    return np.stack((radius * sinPhi * np.cos(theta),
+                     radius * sinPhi * np.sin(theta),
+                     radius * np.cos(phi)), axis=-1)
+
+
+# coordonnées (rayon, phi, theta) en float64 données à vtkSphericalTransform par les
+# anciens scripts, depuis latitude, longitude (degrés) et altitude (mètres)
+def geoToSpherical(lat, lon, altitude, earthRadius, lonAdapt=1.0):
+    return (earthRadius + np.asarray(altitude, dtype=np.float64),
+            angleToRad(np.asarray(lat, dtype=np.float64)),
+            angleToRad(np.asarray(lon, dtype=np.float64) * lonAdapt))
+
+
+# points cartésiens (N, 3) depuis latitude, longitude (degrés) et altitude (mètres)
+def geoToCartesian(lat, lon, altitude, earthRadius, lonAdapt=1.0, origin=None, dtype=np.float32):
+    points = sphericalToCartesian(*geoToSpherical(lat, lon, altitude, earthRadius, lonAdapt))
+    if origin is not None:
+        points -= origin
+    return points.astype(dtype)
+
+
+# origine locale (float64) au niveau de la mer pour une latitude / longitude
+def localOrigin(lat, lon, earthRadius, lonAdapt=1.0):
+    return geoToCartesian(lat, lon, 0.0, earthRadius, lonAdapt, dtype=np.float64)
@@ -0,0 +1,95 @@
+import vtk
+import zlib
+import queue
+import struct
+import threading
+import numpy as np
+from vtk.util import numpy_support
+
+'''
+Écriture des images rendues en arrière-plan.
+
+Les pixels de la fenêtre sont copiés dans un tableau NumPy, puis encodés en PNG
+par un thread séparé pendant que le rendu suivant continue. L'encodage utilise
+zlib, qui relâche le GIL pendant la compression : avec vtkPNGWriter, le GIL reste
+pris et le thread ne ferait que bloquer le rendu. Les écritures synchrones
+(render.renderToFile) gardent vtkPNGWriter.
+'''
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# nombre d'images en attente au-delà duquel le rendu attend le thread d'écriture
+DEFAULT_QUEUE_SIZE = 8
+
+
+# pixels de la fenêtre (hauteur, largeur, RGB), première ligne en haut comme dans un PNG
+def windowPixels(renderWindow):
+    w2i = vtk.vtkWindowToImageFilter()
+    w2i.SetInput(renderWindow)
+    w2i.Update()
+    image = w2i.GetOutput()
+    width, height, _ = image.GetDimensions()
+    pixels = numpy_support.vtk_to_numpy(image.GetPointData().GetScalars())
+    return np.ascontiguousarray(pixels.reshape(height, width, -1)[::-1])
+
+
+def _chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + \
+        struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+
+# écrit un tableau (hauteur, largeur, 3 ou 4) uint8 en PNG, depuis le thread de BackgroundWriter
+def writePng(path, pixels, level=6):
+    height, width, components = pixels.shape
+    colorType = {1: 0, 3: 2, 4: 6}[components]
+
+    # chaque ligne est précédée du filtre PNG 0 (aucun)
+    rows = np.zeros((height, width * components + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, -1)
+
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE)
+        f.write(_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, colorType, 0, 0, 0)))
+        f.write(_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)))
+        f.write(_chunk(b"IEND", b""))
+
+
+# writer vidéo disponible dans cette version de VTK : AVI (Windows) sinon Ogg Theora
+def createVideoWriter(path, rate=30):
+    writer = vtk.vtkAVIWriter() if hasattr(vtk, "vtkAVIWriter") else vtk.vtkOggTheoraWriter()
+    writer.SetFileName(path)
+    writer.SetRate(rate)
+    return writer
+
+
+class BackgroundWriter:
+
+    def __init__(self, queueSize=DEFAULT_QUEUE_SIZE):
+        self.queue = queue.Queue(queueSize)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, pixels = item
+            try:
+                writePng(path, pixels)
+            except Exception as error:
+                self.error = error
+
+    # l'image est gardée telle quelle, les pixels ne doivent plus être modifiés
+    def submit(self, path, pixels):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((path, pixels))
+
+    # attend la fin des écritures en cours
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
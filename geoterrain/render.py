@@ -0,0 +1,47 @@
+import vtk
+from .geomesh import angleToRad, sphericalToCartesian
+
+'''
+Caméra et rendu dans un fichier pour les vues de terrain.
+'''
+
+
+# caméra posée au dessus de (lat, lon) à distanceFactor rayons terrestres du centre,
+# visant focalPoint (le centre de la carte), nord vers le haut de l'image
+def placeCamera(renderer, lat, lon, earthRadius, distanceFactor, focalPoint, lonAdapt=1.0):
+    cameraPosOut = sphericalToCartesian(distanceFactor * earthRadius,
+                                        angleToRad(lat), angleToRad(lon * lonAdapt))
+
+    camera = vtk.vtkCamera()
+    camera.SetPosition(cameraPosOut)
+    camera.SetFocalPoint(focalPoint)
+    camera.Roll(-90)
+    renderer.SetActiveCamera(camera)
+    renderer.ResetCameraClippingRange()
+    return camera
+
+
+# fenêtre de rendu hors écran ; le FXAA donne une image noire avec certains pilotes
+# (Mesa), on lisse plutôt par multi-échantillonnage
+def offscreenWindow(renderer, size, multiSamples=8):
+    renderer.SetUseFXAA(False)
+    renWin = vtk.vtkRenderWindow()
+    renWin.OffScreenRenderingOn()
+    renWin.SetMultiSamples(multiSamples)
+    renWin.AddRenderer(renderer)
+    renWin.SetSize(size)
+    return renWin
+
+
+# rend la fenêtre et l'écrit en PNG (écriture synchrone ; BackgroundWriter pour
+# écrire pendant le rendu suivant)
+def renderToFile(renderWindow, path):
+    renderWindow.Render()
+    w2i = vtk.vtkWindowToImageFilter()
+    w2i.SetInput(renderWindow)
+    w2i.Update()
+
+    writer = vtk.vtkPNGWriter()
+    writer.SetFileName(path)
+    writer.SetInputConnection(w2i.GetOutputPort())
+    writer.Write()
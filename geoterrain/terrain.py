@@ -0,0 +1,97 @@
+import vtk
+import numpy as np
+from vtk.util import numpy_support
+from .geomesh import geoToCartesian
+
+'''
+Construction vectorisée des maillages de terrain depuis un MNT.
+
+Toutes les coordonnées (points, coordonnées de texture et altitudes) sont calculées
+en une fois sous forme de tableaux NumPy, puis données à VTK sans copie via
+numpy_support. Il n'y a plus aucun appel Python par point. Les points sont
+directement cartésiens (voir geomesh), relatifs à origin si elle est donnée.
+
+La comparaison avec l'ancienne boucle point par point est Labo05/checkterrain.py.
+'''
+
+
+# points d'une grille régulière en latitude / longitude (degrés), altitudes (mètres)
+# indexées [longitude][latitude] : la latitude varie le plus vite
+def regularTerrainPoints(altitudes, lats, lons, earthRadius, lonAdapt=1.0, origin=None):
+    latGrid, lonGrid = np.meshgrid(lats, lons)
+    return geoToCartesian(latGrid.ravel(), lonGrid.ravel(), np.asarray(altitudes).ravel(),
+                          earthRadius, lonAdapt, origin)
+
+
+# vtkStructuredGrid de dimensions (points par ligne, lignes) sur des tableaux NumPy,
+# donnés à VTK sans copie
+def demGrid(points, dimensions, scalars=None, tcoords=None):
+    structuredGrid = vtk.vtkStructuredGrid()
+    structuredGrid.SetDimensions([dimensions[0], dimensions[1], 1])
+
+    vtkPoints = vtk.vtkPoints()
+    vtkPoints.SetData(numpy_support.numpy_to_vtk(points, deep=False))
+    structuredGrid.SetPoints(vtkPoints)
+
+    if tcoords is not None:
+        structuredGrid.GetPointData().SetTCoords(numpy_support.numpy_to_vtk(tcoords, deep=False))
+    if scalars is not None:
+        structuredGrid.GetPointData().SetScalars(numpy_support.numpy_to_vtk(scalars, deep=False))
+    return structuredGrid
+
+
+# surface (vtkPolyData) d'une grille, à donner au mapper
+def gridSurface(structuredGrid):
+    geometryFilter = vtk.vtkStructuredGridGeometryFilter()
+    geometryFilter.SetInputData(structuredGrid)
+    geometryFilter.Update()
+    return geometryFilter.GetOutput()
+
+
+# coordonnées géographiques projetées (latitudes, longitudes), texture et altitudes
+# dans l'ordre de la grille : la latitude varie le plus vite, comme dans la double
+# boucle d'origine
+def terrainCoordinates(mapData, lonRange, latRange, xRange, yRange, project, toTexture):
+    minX, maxX = xRange
+    minY, maxY = yRange
+    sizeX = maxX - minX
+    sizeY = maxY - minY
+
+    lons = np.linspace(lonRange[0], lonRange[1], sizeX)
+    lats = np.linspace(latRange[0], latRange[1], sizeY)[::-1]
+
+    lonGrid, latGrid = np.meshgrid(lons, lats, indexing='ij')
+    lonGrid = lonGrid.ravel()
+    latGrid = latGrid.ravel()
+
+    # altitudes de la fenêtre, indexées [x][y] pour suivre l'ordre des points
+    altitudes = np.asarray(mapData[minY:maxY, minX:maxX]).T.ravel().astype(np.int32)
+
+    # une seule projection et une seule inversion pour toute la grille
+    newLon, newLat = project(lonGrid, latGrid)
+    l, m = toTexture(lonGrid, latGrid)
+
+    tcoords = np.empty((sizeX * sizeY, 2), dtype=np.float32)
+    tcoords[:, 0] = l
+    tcoords[:, 1] = m
+
+    return newLat, newLon, tcoords, altitudes
+
+
+# construit les tableaux (points, texture, altitudes) dans l'ordre de la grille
+def terrainArrays(mapData, lonRange, latRange, xRange, yRange,
+                  project, toTexture, earthRadius, lonAdapt, origin=None):
+    lats, lons, tcoords, altitudes = terrainCoordinates(
+        mapData, lonRange, latRange, xRange, yRange, project, toTexture)
+    points = geoToCartesian(lats, lons, altitudes, earthRadius, lonAdapt, origin)
+    return points, tcoords, altitudes
+
+
+# crée la vtkStructuredGrid à partir des tableaux, sans copie
+def buildTerrainGrid(mapData, lonRange, latRange, xRange, yRange,
+                     project, toTexture, earthRadius, lonAdapt, origin=None):
+    points, tcoords, altitudes = terrainArrays(
+        mapData, lonRange, latRange, xRange, yRange,
+        project, toTexture, earthRadius, lonAdapt, origin)
+
+    return demGrid(points, (yRange[1] - yRange[0], xRange[1] - xRange[0]), altitudes, tcoords)
@@ -0,0 +1,201 @@
+import os
+import json
+import hashlib
+import vtk
+
+'''
+Cache sur disque des résultats d'un pipeline VTK, adressé par contenu (surfaces
+et distances de Labo04/knee.py, terrain transformé de Labo05/planeur.py).
+
+La clé est l'empreinte du contenu des fichiers d'entrée et des paramètres des
+filtres (isovaleurs, facteurs de réduction, clé de l'étape précédente...), plus la
+version de VTK : changer l'un d'eux donne une autre clé, un résultat périmé n'est
+jamais relu. N'importe quel vtkDataObject peut être gardé (polydata, image...) :
+il est écrit en XML VTK binaire compressé (LZ4, rapide à relire), dans un fichier
+temporaire renommé ensuite pour que l'écriture soit atomique. Un fichier illisible
+est supprimé et le résultat recalculé. Les entrées les moins récemment utilisées
+sont supprimées au-delà de la taille maximale.
+'''
+
+# taille maximale du cache par défaut (octets)
+DEFAULT_MAX_BYTES = 1 << 30
+
+DIGESTS_FILE = "digests.json"
+
+# lecteur XML VTK de chaque extension gardée dans le cache
+READERS = {
+    ".vtp": vtk.vtkXMLPolyDataReader,
+    ".vti": vtk.vtkXMLImageDataReader,
+    ".vtu": vtk.vtkXMLUnstructuredGridReader,
+    ".vts": vtk.vtkXMLStructuredGridReader,
+    ".vtr": vtk.vtkXMLRectilinearGridReader,
+}
+EXTENSIONS = tuple(READERS)
+
+
+class PipelineCache:
+
+    def __init__(self, directory, maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        os.makedirs(directory, exist_ok=True)
+
+    # empreinte du contenu d'un fichier, recalculée seulement si sa taille ou sa date change
+    def fileDigest(self, path):
+        digestsPath = os.path.join(self.directory, DIGESTS_FILE)
+        digests = {}
+        if os.path.isfile(digestsPath):
+            with open(digestsPath) as f:
+                digests = json.load(f)
+
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        entry = digests.get(os.path.abspath(path))
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        digests[os.path.abspath(path)] = [signature, digest.hexdigest()]
+
+        temporaryPath = digestsPath + ".{}.tmp".format(os.getpid())
+        with open(temporaryPath, "w") as f:
+            json.dump(digests, f)
+        os.replace(temporaryPath, digestsPath)
+        return digest.hexdigest()
+
+    # clé d'un résultat à partir de paramètres sérialisables en JSON ; la clé d'une
+    # étape peut être donnée en paramètre de la suivante
+    def key(self, **parameters):
+        parameters["vtk"] = vtk.vtkVersion.GetVTKVersion()
+        return hashlib.sha1(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+    # fichier existant d'une clé, None si absent
+    def path(self, key):
+        for extension in EXTENSIONS:
+            path = os.path.join(self.directory, key + extension)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def load(self, key):
+        path = self.path(key)
+        if path is None:
+            return None
+
+        # un fichier tronqué ou corrompu est signalé par le lecteur, pas par une exception
+        errors = []
+        reader = READERS[os.path.splitext(path)[1]]()
+        reader.AddObserver("ErrorEvent", lambda obj, event: errors.append(event))
+        reader.SetFileName(path)
+        reader.Update()
+        dataObject = reader.GetOutputDataObject(0)
+        if errors or dataObject is None:
+            os.remove(path)
+            return None
+
+        # date d'accès mise à jour pour l'éviction LRU
+        os.utime(path)
+        return dataObject
+
+    def store(self, key, dataObject):
+        writer = vtk.vtkXMLDataObjectWriter.NewWriter(dataObject.GetDataObjectType())
+        path = os.path.join(self.directory, key + "." + writer.GetDefaultFileExtension())
+        temporaryPath = path + ".{}.tmp".format(os.getpid())
+
+        writer.SetInputData(dataObject)
+        writer.SetFileName(temporaryPath)
+        writer.SetDataModeToAppended()
+        writer.EncodeAppendedDataOff()
+        writer.SetCompressorTypeToLZ4()
+        if not writer.Write():
+            if os.path.isfile(temporaryPath):
+                os.remove(temporaryPath)
+            raise IOError("Unable to write cache entry " + path)
+        os.replace(temporaryPath, path)
+
+        self.evict()
+
+    def invalidate(self, key):
+        path = self.path(key)
+        if path is not None:
+            os.remove(path)
+
+    # supprime les entrées les moins récemment utilisées au-delà de maxBytes
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(EXTENSIONS):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries[:-1]:
+            if total <= self.maxBytes:
+                break
+            os.remove(path)
+            total -= size
+
+    # résultat en cache, ou construit par build() puis enregistré ; refresh force le calcul
+    def cached(self, key, build, refresh=False):
+        dataObject = None if refresh else self.load(key)
+        if dataObject is None:
+            dataObject = build()
+            self.store(key, dataObject)
+        return dataObject
+
+
+# temps de calcul et de relecture d'un filtre coûteux (distance entre deux surfaces)
+# et vérification qu'un fichier corrompu est recalculé : python pipelinecache.py
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+    cache = PipelineCache(directory)
+
+    source = vtk.vtkRTAnalyticSource()
+    source.SetWholeExtent(-40, 40, -40, 40, -40, 40)
+
+    def surface(value):
+        contour = vtk.vtkContourFilter()
+        contour.SetInputConnection(source.GetOutputPort())
+        contour.SetValue(0, value)
+        contour.ComputeScalarsOff()
+        contour.Update()
+        return contour.GetOutput()
+
+    def distance():
+        distanceFilter = vtk.vtkDistancePolyDataFilter()
+        distanceFilter.SetInputData(0, surface(150))
+        distanceFilter.SetInputData(1, surface(100))
+        distanceFilter.Update()
+        return distanceFilter.GetOutput()
+
+    key = cache.key(stage="distance", inner=150, outer=100)
+    cache.invalidate(key)
+
+    start = time.perf_counter()
+    built = cache.cached(key, distance)
+    buildTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = cache.cached(key, distance)
+    loadTime = time.perf_counter() - start
+
+    assert loaded.GetNumberOfPoints() == built.GetNumberOfPoints()
+    assert loaded.GetPointData().GetScalars().GetRange() == built.GetPointData().GetScalars().GetRange()
+
+    # fichier tronqué : l'entrée est supprimée et recalculée
+    path = cache.path(key)
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        f.truncate(size // 2)
+    assert cache.load(key) is None and cache.path(key) is None
+
+    print("{} points, calcul {:.2f}s, relecture {:.3f}s, fichier {} Kio".format(
+        built.GetNumberOfPoints(), buildTime, loadTime, size // 1024))